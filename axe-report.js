@@ -1,39 +0,0 @@
-/**
- * Generate a combined accessibility report in CSV format from JSON results.
- *
- * Copyright 2017-2020 ICTU
- * Copyright 2017-2022 Leiden University
- * Copyright 2017-2023 Leon Helwerda
- *
- * Licensed under the Apache License, Version 2.0 (the "License");
- * you may not use this file except in compliance with the License.
- * You may obtain a copy of the License at
- *
- *     http://www.apache.org/licenses/LICENSE-2.0
- *
- * Unless required by applicable law or agreed to in writing, software
- * distributed under the License is distributed on an "AS IS" BASIS,
- * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
- * See the License for the specific language governing permissions and
- * limitations under the License.
- */
-const axe = require('@ictu/axe-reports'),
-      fs = require('fs');
-
-const directory = 'test/accessibility/';
-
-fs.readdir(directory, {}, function(error, files) {
-    if (error) {
-        throw error;
-    }
-    let newReport = true;
-    files.forEach(function(filename) {
-        if (filename.endsWith('.json')) {
-            axe.processResults(
-                JSON.parse(fs.readFileSync(directory + filename)),
-                'csv', directory + 'report.txt', newReport
-            );
-            newReport = false;
-        }
-    });
-});
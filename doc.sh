@@ -104,9 +104,8 @@ done
 echo "Performing schema validation"
 check-jsonschema --check-metaschema $SCHEMAS
 
-# Loops over each sample glob path and schema URI in tests/schema-samples.json
-# Then run:
-# check-jsonschema --schemafile $SCHEMA --base-uri $PATH_TO_SCHEMA_DIR $PATHS
-jq -r "to_entries|map(\"check-jsonschema --schemafile file://$PWD/schema/\(.value) --base-uri file://$PWD/schema/\(.value[0:.value | split(\"#\") | .[0] | rindex(\"/\")])/ test/sample/\(.key)\")|.[]" test/schema-samples.json | sh -x -
+# Validate the sample files matching each glob path in test/schema-samples.json
+# against their schemas, in parallel with the schemas loaded once per process
+python validate_data.py --samples test/schema-samples.json --data test/sample
 
 cd doc && SPHINXOPTS=$DEFINES make $target
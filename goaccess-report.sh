@@ -1,5 +1,7 @@
 #!/bin/bash
 # Start a GoAccess server to display access logs.
+# If GOACCESS_DB_PATH is set, then only new log lines are processed and added
+# to the GoAccess database in that directory.
 #
 # Copyright 2017-2020 ICTU
 # Copyright 2017-2022 Leiden University
@@ -30,4 +32,11 @@ if [ ! -z "$GOACCESS_DAEMON" ]; then
 fi
 
 log_path=$(jq -r .goaccess_log_path $CONFIG)
-zcat $log_path/access.log*.gz | bash -c "/usr/local/bin/goaccess $params $log_path/access*.log - "
+if [ ! -z "$GOACCESS_DB_PATH" ]; then
+    set -o pipefail
+    mkdir -p "$GOACCESS_DB_PATH"
+    state="$GOACCESS_DB_PATH/offsets.json"
+    python3 "$(dirname "$0")/goaccess_logs.py" "$log_path" --state "$state" | bash -c "/usr/local/bin/goaccess $params --persist --restore --db-path=$GOACCESS_DB_PATH - " && mv "$state.new" "$state"
+else
+    zcat $log_path/access.log*.gz | bash -c "/usr/local/bin/goaccess $params $log_path/access*.log - "
+fi
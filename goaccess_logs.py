@@ -0,0 +1,175 @@
+"""
+Output the lines of access logs that have not yet been processed by GoAccess.
+
+Log files are recognized by their first line, such that the offset up to
+which a log was processed is kept when the log is rotated or compressed.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from argparse import ArgumentParser
+import gzip
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+import struct
+import sys
+
+# Size of the chunks to read and write at once.
+CHUNK_SIZE = 1024 * 1024
+
+# Pattern of the rotation number of a log file.
+ROTATION_PATTERN = re.compile(r'\.(\d+)(?:\.gz)?$')
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+
+    parser = ArgumentParser(description='Output new lines of access logs')
+    parser.add_argument('log_path', help='Directory with the access logs')
+    parser.add_argument('--state', required=True,
+                        help='JSON file with the processed offsets of logs; '
+                        'the new offsets are written to a file with the same '
+                        'name with .new appended')
+    parser.add_argument('--pattern', action='append', default=[],
+                        help='Glob patterns of the logs to process, by '
+                        'default access.log*.gz and access*.log')
+    return parser.parse_args()
+
+def find_logs(log_path, patterns):
+    """
+    Find the log files and sort them from the oldest rotated log to the
+    current logs.
+    """
+
+    files = set()
+    for pattern in patterns:
+        files.update(path for path in Path(log_path).glob(pattern)
+                     if path.is_file())
+
+    def rotation(path):
+        match = ROTATION_PATTERN.search(path.name)
+        return (-int(match.group(1)) if match else 0, path.name)
+
+    return sorted(files, key=rotation)
+
+def open_log(path):
+    """
+    Open a log file in binary mode, decompressing it if it is compressed.
+    """
+
+    if path.suffix == '.gz':
+        return gzip.open(path, 'rb')
+
+    return open(path, 'rb')
+
+def log_size(path):
+    """
+    Determine the size of the uncompressed contents of a log file that end in
+    a complete line.
+    """
+
+    if path.suffix == '.gz':
+        # The gzip trailer holds the uncompressed size modulo 2^32; rotated
+        # logs are complete, so their last line is not checked.
+        with open(path, 'rb') as log_file:
+            log_file.seek(-4, os.SEEK_END)
+            return struct.unpack('<I', log_file.read(4))[0]
+
+    # Leave out a line that is still being written at the end of the log
+    with open(path, 'rb') as log_file:
+        size = log_file.seek(0, os.SEEK_END)
+        position = size
+        while position > 0:
+            start = max(0, position - CHUNK_SIZE)
+            log_file.seek(start)
+            chunk = log_file.read(position - start)
+            newline = chunk.rfind(b'\n')
+            if newline != -1:
+                return start + newline + 1
+            position = start
+
+        return 0
+
+def fingerprint(path):
+    """
+    Determine an identifier of the contents of a log file from its first line,
+    or `None` if the log has no complete line.
+    """
+
+    with open_log(path) as log_file:
+        line = log_file.readline()
+
+    if not line.endswith(b'\n'):
+        return None
+
+    return hashlib.sha256(line).hexdigest()
+
+def copy_lines(path, offset, size, output):
+    """
+    Write the contents of a log file from the `offset` up to the `size` to
+    the output stream.
+    """
+
+    with open_log(path) as log_file:
+        if offset > 0:
+            log_file.seek(offset)
+        remaining = size - offset
+        while remaining > 0:
+            chunk = log_file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            output.write(chunk)
+            remaining -= len(chunk)
+
+def main():
+    """
+    Main entry point.
+    """
+
+    args = parse_args()
+    try:
+        with open(args.state, 'r', encoding='utf-8') as state_file:
+            state = json.load(state_file)
+    except FileNotFoundError:
+        state = {}
+
+    new_state = {}
+    patterns = args.pattern if args.pattern else ['access.log*.gz', 'access*.log']
+    for path in find_logs(args.log_path, patterns):
+        key = fingerprint(path)
+        if key is None:
+            continue
+
+        offset = state.get(key, 0)
+        size = log_size(path)
+        if size > offset:
+            copy_lines(path, offset, size, sys.stdout.buffer)
+            offset = size
+        new_state[key] = max(offset, new_state.get(key, 0))
+
+    sys.stdout.buffer.flush()
+    with open(f'{args.state}.new', 'w', encoding='utf-8') as state_file:
+        json.dump(new_state, state_file)
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""
+Write precompressed variants of published assets for the proxy to serve.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from argparse import ArgumentParser
+import gzip
+import json
+import os
+from pathlib import Path
+import shutil
+import sys
+
+# Extensions of files that benefit from compression. Images other than SVG,
+# fonts in WOFF formats and ZIP archives are already compressed. The proxy
+# configurations serve the variants for the same extensions.
+with open(Path(__file__).resolve().parent / 'lib' / 'compressed.json', 'r',
+          encoding='utf-8') as _extensions_file:
+    EXTENSIONS = {f'.{extension}' for extension in json.load(_extensions_file)}
+
+# Suffixes of the compressed variants.
+SUFFIXES = ('.gz', '.br')
+
+# Suffix of the hidden, empty markers of variants that would not reduce the
+# size of their file, which have the modification time of the file like the
+# variants, such that the file is only compressed again once it changes.
+MARKER = '.skip'
+
+# Files smaller than this number of bytes are not worth compressing.
+MIN_SIZE = 256
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+
+    parser = ArgumentParser(description='Write .gz and .br files of assets')
+    parser.add_argument('paths', nargs='+',
+                        help='Published directories to compress assets in')
+    parser.add_argument('--source', default=None,
+                        help='Directory that was copied into the paths, to '
+                        'only compress the assets that came from it')
+    parser.add_argument('--previous', default=None,
+                        help='Earlier copy of the directory from which to link '
+                        'variants of files that are hard links to it')
+    parser.add_argument('--no-brotli', dest='brotli', action='store_false',
+                        default=True, help='Only write gzip variants')
+    return parser.parse_args()
+
+def marker_path(path, suffix):
+    """
+    Determine the path of the marker of a variant with the `suffix` of a file.
+    """
+
+    return path.with_name(f'.{path.name}{suffix}{MARKER}')
+
+def load_brotli():
+    """
+    Import the optional Brotli module. Returns the module or `None` if it is
+    not installed.
+    """
+
+    try:
+        # pylint: disable=import-outside-toplevel
+        import brotli
+    except ImportError:
+        return None
+
+    return brotli
+
+class Compressor:
+    """
+    Writer of compressed variants of files in a directory tree.
+    """
+
+    def __init__(self, brotli=None, previous=None):
+        self._encoders = [('.gz', self._gzip)]
+        if brotli is not None:
+            self._brotli = brotli
+            self._encoders.append(('.br', self._compress_brotli))
+
+        self._previous = Path(previous) if previous is not None else None
+        self.counts = {'written': 0, 'linked': 0, 'skipped': 0, 'removed': 0}
+
+    @staticmethod
+    def _gzip(path, variant):
+        with open(path, 'rb') as source:
+            with open(variant, 'wb') as target:
+                # Leave out the name and use the time of the original file, so
+                # that the variant only changes along with the file.
+                with gzip.GzipFile(filename='', mode='wb', fileobj=target,
+                                   compresslevel=9,
+                                   mtime=int(path.stat().st_mtime)) as output:
+                    shutil.copyfileobj(source, output)
+
+    def _compress_brotli(self, path, variant):
+        compressor = self._brotli.Compressor(quality=11)
+        with open(path, 'rb') as source:
+            with open(variant, 'wb') as target:
+                for chunk in iter(lambda: source.read(1024 * 1024), b''):
+                    target.write(compressor.process(chunk))
+                target.write(compressor.finish())
+
+    def _link_previous(self, path, relative, suffix):
+        # Reuse the variant or marker from the earlier copy if the file is
+        # unchanged
+        if self._previous is None:
+            return False
+
+        old = self._previous / relative
+        try:
+            if not os.path.samefile(path, old):
+                return False
+        except OSError:
+            return False
+
+        for new in (path.with_name(path.name + suffix),
+                    marker_path(path, suffix)):
+            try:
+                if old.with_name(new.name).stat().st_mtime != \
+                        path.stat().st_mtime:
+                    continue
+                os.link(old.with_name(new.name), new)
+            except OSError:
+                continue
+
+            return True
+
+        return False
+
+    @staticmethod
+    def _is_current(paths, stat):
+        # Check whether the variant or marker has the time of the file, and
+        # remove outdated ones
+        current = False
+        for path in paths:
+            try:
+                if path.stat().st_mtime == stat.st_mtime:
+                    current = True
+                else:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+        return current
+
+    def compress_file(self, path, relative):
+        """
+        Write the compressed variants of a file, unless they are up to date or
+        do not reduce the size of the file, in which case a marker is written.
+        """
+
+        stat = path.stat()
+        for suffix, encode in self._encoders:
+            variant = path.with_name(path.name + suffix)
+            marker = marker_path(path, suffix)
+            if self._is_current((variant, marker), stat):
+                continue
+
+            if self._link_previous(path, relative, suffix):
+                self.counts['linked'] += 1
+                continue
+
+            temp = variant.with_name(f'.{variant.name}.tmp')
+            encode(path, temp)
+            if temp.stat().st_size >= stat.st_size:
+                temp.write_bytes(b'')
+                variant = marker
+                self.counts['skipped'] += 1
+            else:
+                self.counts['written'] += 1
+
+            os.utime(temp, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            os.replace(temp, variant)
+
+    def compress_tree(self, root, source=None):
+        """
+        Write compressed variants of the assets in a directory tree and remove
+        variants of files that no longer exist. If a `source` directory is
+        given, then only the files that are also in the source are handled.
+        """
+
+        root = Path(root)
+        walk = Path(source) if source is not None else root
+        for directory, _, files in os.walk(walk):
+            for name in files:
+                relative = Path(directory, name).relative_to(walk)
+                path = root / relative
+                if name.startswith('.') and path.suffix == MARKER:
+                    # Marker of a variant of a file that was removed
+                    base = path.with_name(name[1:]).with_suffix('') \
+                        .with_suffix('')
+                    if source is None and not os.path.lexists(base):
+                        path.unlink()
+                        self.counts['removed'] += 1
+                    continue
+
+                if path.suffix in SUFFIXES:
+                    # Variant of a compressible file that was removed
+                    base = path.with_suffix('')
+                    if source is None and \
+                            base.suffix.lower() in EXTENSIONS and \
+                            not os.path.lexists(base):
+                        path.unlink()
+                        self.counts['removed'] += 1
+                    continue
+
+                if path.suffix.lower() in EXTENSIONS and \
+                        path.is_file() and not path.is_symlink() and \
+                        path.stat().st_size >= MIN_SIZE:
+                    self.compress_file(path, relative)
+
+def main():
+    """
+    Main entry point.
+    """
+
+    args = parse_args()
+    brotli = load_brotli() if args.brotli else None
+    if args.brotli and brotli is None:
+        print('Brotli module is not installed, only writing gzip variants',
+              file=sys.stderr)
+
+    compressor = Compressor(brotli, args.previous)
+    for path in args.paths:
+        compressor.compress_tree(path, args.source)
+
+    print(f"Wrote {compressor.counts['written']} compressed files, linked "
+          f"{compressor.counts['linked']}, skipped "
+          f"{compressor.counts['skipped']} incompressible and removed "
+          f"{compressor.counts['removed']} outdated files")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
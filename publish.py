@@ -0,0 +1,641 @@
+"""
+Copy visualization artifacts to a published site for direct access.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+import hashlib
+import json
+import os
+from pathlib import Path
+import re
+import shlex
+import shutil
+import ssl
+import subprocess
+import sys
+from urllib.parse import urljoin, urlsplit
+from urllib.request import Request, urlopen
+from precompress import EXTENSIONS, MARKER, SUFFIXES, Compressor, load_brotli
+
+# Repositories that have JSON schemas and a Jenkins build that archives them.
+ARCHIVE_NAMES = (
+    'visualization-site', 'prediction', 'data-analysis', 'monetdb-import',
+    'export-exchange', 'deployer', 'data-gathering', 'data-gathering-compose',
+    'agent-config'
+)
+# Subset of repositories that have openapi.json files in subdirectories and
+# a Jenkins build that archives them, excluding visualization-site.
+OPENAPI_NAMES = ('data-gathering', 'export-exchange')
+# Repositories that are provided as an NPM package under the @gros scope with
+# packaged JSON schemas in them.
+MODULE_NAMES = ('visualization-ui',)
+# Repositories whose visualizations are available from their respective `_url`
+# paths, rather than a subpath of their repository name.
+ROOT_NAMES = ('visualization-site', 'prediction-site')
+
+# Commands to copy directories, replacing or adding to the target contents.
+# Compressed variants of assets, their markers and the data manifest are kept
+# when replacing, since they are not in the source but are updated after the
+# copy.
+COPY = ['rsync', '-au', '--delete', '--exclude', 'htmlpublisher-wrapper.html',
+        '--filter=P /data-manifest.json'] + [
+    f'--filter=P {pattern}'
+    for extension in sorted(EXTENSIONS) for suffix in SUFFIXES
+    for pattern in (f'*{extension}{suffix}', f'.*{extension}{suffix}{MARKER}')
+]
+COPY_APPEND = ['rsync', '-au', '--exclude', 'htmlpublisher-wrapper.html']
+
+# Name of the manifest with content hashes of the data files of a published
+# visualization, which is kept next to its data directory.
+DATA_MANIFEST = 'data-manifest.json'
+
+# Patterns of data files with the schemas to validate them with, and the
+# maximum number of violations to report for each file.
+SCHEMA_SAMPLES = 'test/schema-samples.json'
+VALIDATE_LIMIT = 10
+
+# Command to manage the standalone Swagger UI instance.
+SWAGGER_COMPOSE = ['docker', 'compose', '-f', 'swagger/docker-compose.yml']
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+
+    parser = ArgumentParser(description='Publish visualization artifacts')
+    parser.add_argument('--jobs', type=int,
+                        default=int(os.getenv('VISUALIZATION_PUBLISH_JOBS', '4')),
+                        help='Number of builds to copy concurrently')
+    parser.add_argument('--manifest', default=os.getenv(
+        'VISUALIZATION_PUBLISH_MANIFEST',
+        str(Path(os.getenv('JENKINS_HOME', '.')) / 'visualization-publish.json')
+    ), help='JSON file with the builds that were published earlier')
+    parser.add_argument('--force', action='store_true', default=False,
+                        help='Publish all builds even if they are unchanged')
+    parser.add_argument('--snapshots', type=int, default=int(
+        os.getenv('VISUALIZATION_PUBLISH_SNAPSHOTS', '0')
+    ), help='Number of snapshots to keep of each published directory, with '
+    'the directory replaced by a link to its current snapshot; 0 to copy into '
+    'the directory directly')
+    parser.add_argument('--no-compress', dest='compress', action='store_false',
+                        default=os.getenv('VISUALIZATION_PUBLISH_COMPRESS',
+                                          'true') == 'true',
+                        help='Do not write precompressed variants of assets')
+    parser.add_argument('--validate', action='store_true',
+                        default=os.getenv('VISUALIZATION_PUBLISH_VALIDATE',
+                                          'false') == 'true',
+                        help='Validate the data files of visualizations with '
+                        'the schemas before they are published')
+    return parser.parse_args()
+
+def read_build_id(path, build):
+    """
+    Retrieve the ID of a build from the permalinks of a Jenkins job branch.
+    """
+
+    try:
+        with open(path / 'builds' / 'permalinks', 'r',
+                  encoding='utf-8') as permalinks:
+            for line in permalinks:
+                if line.startswith(f'{build} '):
+                    return line[len(build) + 1:].strip()
+    except FileNotFoundError:
+        pass
+
+    return ''
+
+class Publisher:
+    """
+    Resolver of the builds of visualizations and archives to publish, with the
+    steps to copy each of them to the target.
+    """
+
+    def __init__(self, config, target, jobs_path, visualization_names,
+                 **options):
+        self._config = config
+        self._target = Path(target)
+        self._jobs_path = Path(jobs_path)
+        self._visualization_names = visualization_names
+        self._options = {
+            'snapshots': options.get('snapshots', 0),
+            'compress': options.get('compress', False),
+            'validate': options.get('validate', False)
+        }
+        self._branch = os.getenv('BRANCH_NAME', '')
+        self._production = os.getenv('PUBLISH_PRODUCTION') == 'true'
+
+    def _job(self, repo):
+        # Job name, branch pattern, build permalink, configuration URL prefix
+        # and default organization of a repository
+        default_organization = self._config.get('hub_mapping', {}) \
+            .get('hub', {}).get('organization', {}).get('default', 'combined')
+        if repo == 'prediction':
+            # Include all branches; prediction builds do not archive new
+            # artifacts if they are UNSTABLE
+            return f'create-{repo}', '*', 'lastStableBuild', 'prediction', \
+                'combined'
+        if repo == 'prediction-site':
+            return f'build-{repo}', '*master', 'lastSuccessfulBuild', \
+                'prediction', 'combined'
+        if repo == 'visualization-site':
+            branches = self._branch if self._branch and self._production \
+                else '*master'
+            return f'build-{repo}', branches, 'lastSuccessfulBuild', \
+                'visualization', 'combined'
+
+        return f'build-{repo}', '*master', 'lastSuccessfulBuild', \
+            'visualization', default_organization
+
+    def _copy(self, source, destination, data=False, name=None):
+        # Steps to replace the contents of a directory with those of a source,
+        # and to update the data manifest and compressed variants afterward.
+        # The data files of the visualization `name`, or of the destination if
+        # it has a data manifest, are validated in the source beforehand.
+        steps = []
+        if self._options['validate'] and (data or name is not None):
+            steps.append(['validate', source,
+                          name if name is not None else destination.name])
+
+        updates = ['hashes'] if data else []
+        if self._options['compress']:
+            updates.append('compress')
+        if self._options['snapshots'] > 0:
+            return steps + [['snapshot', source, str(destination),
+                             self._options['snapshots'], updates]]
+
+        return steps + [COPY + [source, str(destination)]] + [
+            [update, str(destination)] for update in updates
+        ]
+
+    def _target_path(self, key, organization):
+        # Convert the visualization or prediction URL to a path for the
+        # selected organization
+        url = re.sub(r'(/*)\$organization', rf'\g<1>{organization}',
+                     self._config[f'{key}_url'], count=1)
+        return urlsplit(urljoin('http://example.org', url)).path
+
+    def builds(self):
+        """
+        Resolve the builds of the visualizations and archives to publish. Each
+        build is a dict with a `key` of the repository and branch, the build
+        `id` and the `steps` to publish it.
+        """
+
+        for repo in dict.fromkeys(self._visualization_names + ARCHIVE_NAMES):
+            job, branches, build, key, default_organization = self._job(repo)
+            for path in sorted((self._jobs_path / job / 'branches').glob(branches)):
+                # Retrieve most recent build (even if tests make it UNSTABLE)
+                if repo == 'visualization-site' and os.getenv('BUILD_NUMBER'):
+                    build_id = os.getenv('BUILD_NUMBER')
+                else:
+                    build_id = read_build_id(path, build)
+
+                branch = path.name
+                publish_archive = True
+                if branch == 'master':
+                    organization = default_organization
+                elif self._production and branch == self._branch:
+                    organization = 'combined'
+                else:
+                    organization = next((
+                        hub['organization']
+                        for hub in self._config.get('hub_organizations', [])
+                        if hub.get(f'{key}-site') == branch
+                    ), '')
+                    publish_archive = False
+
+                yield {
+                    'key': f'{repo}/{branch}',
+                    'id': build_id,
+                    'steps': self.steps(repo, path, build_id,
+                                        self._target_path(key, organization),
+                                        publish_archive and repo in ARCHIVE_NAMES)
+                }
+
+    def steps(self, repo, path, build_id, target, publish_archive):
+        """
+        Determine the commands to publish a build of a repository from the
+        job branch `path` to the `target` path within the published site.
+        """
+
+        # Path to the publishable visualization (visualizations and hub)
+        origin = path / 'builds' / build_id / 'htmlreports' / 'Visualization'
+        # Path to the archived files (archive names and prediction)
+        archive = path / 'builds' / build_id / 'archive'
+        if not origin.is_dir():
+            origin = path / 'htmlreports' / 'Visualization'
+
+        site = self._target / target.lstrip('/')
+        steps = []
+        if repo in ROOT_NAMES:
+            # Visualization-site and prediction-site from their root paths.
+            # Only the files of the hub are compressed, since the root paths
+            # contain the other visualizations as well.
+            steps.append(COPY_APPEND + [f'{origin}/', str(site)])
+            if self._options['compress']:
+                steps.append(['compress', str(site), f'{origin}/'])
+        elif repo == 'prediction':
+            # Prediction data
+            output = self._target / repo / path.name / 'output'
+            steps.extend(self._copy(f'{archive}/output/', output,
+                                    name='prediction-site/data'))
+        elif repo in self._visualization_names:
+            steps.extend(self._copy(f'{origin}/', site / repo, data=True))
+
+        if not publish_archive:
+            return steps
+
+        if repo in OPENAPI_NAMES:
+            steps.append(['openapi', str(archive), f'{self._target}/{repo}-'])
+        if repo == 'visualization-site':
+            steps.extend([
+                ['cp', str(archive / 'openapi.json'),
+                 str(self._target / 'openapi.json')],
+                COPY_APPEND + [f'{archive}/schema/', f'{self._target}/schema/'],
+                COPY_APPEND + [f'{path}/htmlreports/Documentation/',
+                               f'{self._target}/schema/'],
+                # Standalone Swagger
+                SWAGGER_COMPOSE + ['up', '-d', '--wait', '--force-recreate'],
+                SWAGGER_COMPOSE + ['cp', 'swagger:/usr/share/nginx/html/',
+                                   'swagger/dist/'],
+                SWAGGER_COMPOSE + ['down']
+            ])
+            steps.extend(self._copy('swagger/dist/', self._target / 'swagger'))
+        else:
+            steps.extend(self._copy(f'{archive}/schema/',
+                                    self._target / 'schema' / repo))
+
+        return steps
+
+def copy_openapi(archive, prefix):
+    """
+    Convert archive paths to OpenAPI specifications to file names that do not
+    conflict with other repositories or paths, for example the archive name
+    `scraper/agent/openapi.json` of `data-gathering` is published as
+    `data-gathering-scraper-agent-openapi.json`.
+    """
+
+    for path in Path(archive).glob('**/openapi.json'):
+        name = path.relative_to(archive).as_posix().replace('/', '-')
+        shutil.copyfile(path, f'{prefix}{name}')
+
+def snapshot_name():
+    """
+    Create a name for a new snapshot, which sorts after earlier snapshots.
+    """
+
+    return datetime.now().strftime('%Y%m%dT%H%M%S.%f')
+
+def compress_assets(destination, source=None, previous=None):
+    """
+    Write precompressed variants of the assets in the destination directory,
+    or only of those that are also in the source directory if it is given.
+    """
+
+    compressor = Compressor(load_brotli(), previous)
+    compressor.compress_tree(destination, source)
+
+@lru_cache(maxsize=None)
+def load_schemas():
+    """
+    Load the JSON schemas and the patterns of the data files to validate with
+    them. Requires the `jsonschema` package, otherwise an `ImportError` is
+    raised.
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from validate_data import Schemas
+    with open(SCHEMA_SAMPLES, 'r', encoding='utf-8') as samples_file:
+        samples = json.load(samples_file)
+
+    return Schemas('schema'), samples
+
+def validate_data(directory, name=None):
+    """
+    Validate the data files of a visualization in the directory while reading
+    them, so that large files do not need to fit in memory. The `name` of the
+    visualization is the name of the directory by default, and may include
+    a subdirectory of the visualization that the directory holds. Raises
+    a `ValueError` if any file is invalid.
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from validate_data import StreamValidator, find_files
+    schemas, samples = load_schemas()
+    validator = StreamValidator(schemas, VALIDATE_LIMIT)
+    tasks, _ = find_files(samples, directory,
+                          name if name is not None else Path(directory).name)
+    invalid = 0
+    for path, reference in tasks:
+        errors = validator.validate(path, reference)
+        for pointer, message in errors:
+            print(f'{path}::{pointer or "/"} ({reference}): {message}',
+                  file=sys.stderr)
+        invalid += bool(errors)
+
+    if invalid:
+        raise ValueError(f'{invalid} data files in {directory} are invalid')
+
+def hash_file(path):
+    """
+    Determine the SHA-256 hash of the contents of a file.
+    """
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as data_file:
+        for chunk in iter(lambda: data_file.read(1024 * 1024), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+def update_data_manifest(directory, previous=None):
+    """
+    Record the content hashes of the data files of a published visualization
+    in its manifest. Files whose contents are the same as in the manifest of
+    the directory, or of the `previous` copy of it, get back their earlier
+    modification time, such that the ETag and Last-Modified validators that
+    the proxy derives from it only change along with the contents.
+    """
+
+    directory = Path(directory)
+    try:
+        with open(Path(previous or directory) / DATA_MANIFEST, 'r',
+                  encoding='utf-8') as manifest_file:
+            files = json.load(manifest_file).get('files', {})
+    except (FileNotFoundError, ValueError):
+        files = {}
+
+    manifest = {}
+    for path in sorted((directory / 'data').glob('**/*')):
+        if not path.is_file() or (path.suffix in SUFFIXES and
+                                  path.with_suffix('').suffix in EXTENSIONS) or \
+                (path.name.startswith('.') and path.suffix == MARKER):
+            continue
+
+        name = path.relative_to(directory).as_posix()
+        stat = path.stat()
+        old = files.get(name, {})
+        mtime = stat.st_mtime_ns
+        if old.get('size') == stat.st_size and old.get('mtime') == mtime:
+            digest = old['sha256']
+        else:
+            digest = hash_file(path)
+            if old.get('sha256') == digest:
+                mtime = old['mtime']
+                os.utime(path, ns=(stat.st_atime_ns, mtime))
+
+        manifest[name] = {'sha256': digest, 'size': stat.st_size, 'mtime': mtime}
+
+    temp = directory / f'.{DATA_MANIFEST}.tmp'
+    with open(temp, 'w', encoding='utf-8') as manifest_file:
+        json.dump({'files': manifest}, manifest_file, indent=4)
+    os.replace(temp, directory / DATA_MANIFEST)
+
+def deploy_snapshot(source, destination, keep, updates=()):
+    """
+    Copy the source directory to a new snapshot next to the destination, with
+    files that are unchanged from the current snapshot hard-linked to it, then
+    atomically replace the destination with a link to the new snapshot and
+    remove older snapshots beyond the number to `keep`. The `updates` are the
+    names of steps to perform on the snapshot before it replaces the current
+    one, such as 'hashes' for the data manifest and 'compress' for the
+    precompressed variants of assets. If a step fails, then the snapshot is
+    removed and the current one stays.
+    """
+
+    if keep < 1:
+        raise ValueError('At least one snapshot must be kept')
+
+    destination = Path(destination)
+    snapshots = destination.parent / f'.{destination.name}.snapshots'
+    snapshots.mkdir(parents=True, exist_ok=True)
+    if destination.is_dir() and not destination.is_symlink():
+        # Adopt a directory that was copied into directly as a snapshot. The
+        # link is prepared first, so that the destination is only missing
+        # between the two renames.
+        adopted = snapshots / snapshot_name()
+        link = destination.parent / f'.{destination.name}.{adopted.name}.link'
+        link.symlink_to(os.path.relpath(adopted, destination.parent))
+        destination.rename(adopted)
+        os.replace(link, destination)
+
+    current = destination.resolve() if destination.is_symlink() else None
+    snapshot = snapshots / snapshot_name()
+    link_dest = [f'--link-dest={current}'] if current is not None else []
+    try:
+        subprocess.run(COPY + link_dest + [source, f'{snapshot}/'], check=True)
+        for update in updates:
+            if update == 'hashes':
+                update_data_manifest(snapshot, previous=current)
+            elif update == 'compress':
+                compress_assets(snapshot, previous=current)
+    except BaseException:
+        shutil.rmtree(snapshot, ignore_errors=True)
+        raise
+
+    link = destination.parent / f'.{destination.name}.{snapshot.name}.link'
+    link.symlink_to(os.path.relpath(snapshot, destination.parent))
+    os.replace(link, destination)
+
+    for old in sorted(snapshots.iterdir())[:-keep]:
+        if old != snapshot:
+            shutil.rmtree(old)
+
+def run_steps(key, steps):
+    """
+    Perform the steps to publish a build. Returns whether all steps succeeded.
+    """
+
+    for step in steps:
+        try:
+            if step[0] == 'openapi':
+                copy_openapi(*step[1:])
+            elif step[0] == 'snapshot':
+                deploy_snapshot(*step[1:])
+            elif step[0] == 'validate':
+                validate_data(*step[1:])
+            elif step[0] == 'hashes':
+                update_data_manifest(*step[1:])
+            elif step[0] == 'compress':
+                compress_assets(*step[1:])
+            else:
+                if step[0] == 'rsync':
+                    Path(step[-1]).mkdir(parents=True, exist_ok=True)
+                subprocess.run(step, check=True)
+        except (OSError, ValueError, subprocess.CalledProcessError) as error:
+            print(f'{key}: {error}', file=sys.stderr)
+            return False
+
+    return True
+
+def fingerprint(build):
+    """
+    Determine an identifier of the build ID and the steps to publish it.
+    """
+
+    return hashlib.sha256(json.dumps([build['id'], build['steps']])
+                          .encode('utf-8')).hexdigest()
+
+def read_names():
+    """
+    Retrieve the names of the visualizations to publish.
+    """
+
+    names = os.getenv('VISUALIZATION_NAMES')
+    if names is None:
+        with open('visualization_names.txt', 'r', encoding='utf-8') as names_file:
+            names = names_file.read()
+
+    return tuple(names.split())
+
+def read_config():
+    """
+    Read the configuration file. Returns the path to the file and the parsed
+    configuration.
+    """
+
+    config_file = os.getenv('VISUALIZATION_SITE_CONFIGURATION', 'config.json')
+    if not Path(config_file).exists():
+        config_file = 'lib/config.json'
+    with open(config_file, 'r', encoding='utf-8') as config_json:
+        return config_file, json.load(config_json)
+
+def read_manifest(path, target):
+    """
+    Read the fingerprints of the builds that were published earlier to the
+    target from the manifest.
+    """
+
+    try:
+        with open(path, 'r', encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+    except FileNotFoundError:
+        return {}
+
+    if manifest.get('target') != target:
+        return {}
+
+    return manifest.get('builds', {})
+
+def purge_cache(config):
+    """
+    Clear the proxy cache of responses from Jenkins, such that the proxy
+    requests newly published builds. The `purge` command from the cache
+    configuration is run if there is one, otherwise the cached files are
+    removed if the cache path is writable. Returns whether the cache was
+    purged.
+    """
+
+    cache = config.get('proxy_cache', {})
+    if cache.get('purge'):
+        subprocess.run(shlex.split(cache['purge']), check=True)
+        return True
+
+    if not cache.get('path') or not os.access(cache['path'], os.W_OK):
+        return False
+
+    # Keep the directory levels, which the proxy does not always recreate
+    for directory, _, files in os.walk(cache['path']):
+        for name in files:
+            Path(directory, name).unlink(missing_ok=True)
+
+    return True
+
+def download_branches(config, target):
+    """
+    Download the prediction branches from the Jenkins API.
+    """
+
+    url = f"{config['jenkins_direct_url']}/job/create-prediction/api/json" \
+        '?tree=jobs[name,lastStableBuild[description,duration,timestamp]]'
+    request = Request(url, headers={
+        'Accept': 'application/json',
+        'Authorization': f"Basic {config['jenkins_api_token']}"
+    })
+    context = ssl.create_default_context(cafile=config['jenkins_direct_cert'])
+    with urlopen(request, context=context) as response:
+        with open(Path(target) / 'branches.json', 'wb') as branches:
+            shutil.copyfileobj(response, branches)
+
+def main():
+    """
+    Main entry point.
+    """
+
+    args = parse_args()
+    config_file, config = read_config()
+    if 'JENKINS_HOME' not in os.environ:
+        print('This script can only be run in a Jenkins context')
+        return 1
+
+    if args.validate:
+        try:
+            load_schemas()
+        except ImportError as error:
+            print(f'Cannot validate data files: {error}')
+            print('Install jsonschema or set VISUALIZATION_PUBLISH_VALIDATE=false')
+            return 1
+
+    if purge_cache(config):
+        print('Purged the proxy cache of Jenkins responses')
+
+    target = config.get('jenkins_direct')
+    if not target:
+        print('No target for copy specified')
+        print(f"To run copy.sh, set 'jenkins_direct' in {config_file} to a path")
+        return 0
+
+    published = read_manifest(args.manifest, target)
+    publisher = Publisher(config, target,
+                          Path(os.environ['JENKINS_HOME']) / 'jobs',
+                          read_names(), snapshots=args.snapshots,
+                          compress=args.compress, validate=args.validate)
+    builds = [
+        build for build in publisher.builds()
+        if args.force or published.get(build['key']) != fingerprint(build)
+    ]
+    print(f'Publishing {len(builds)} changed builds to {target}')
+
+    status = 0
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        results = executor.map(lambda build: run_steps(build['key'],
+                                                       build['steps']), builds)
+        for build, success in zip(builds, results):
+            if success:
+                published[build['key']] = fingerprint(build)
+            else:
+                status = 1
+
+    with open(args.manifest, 'w', encoding='utf-8') as manifest_file:
+        json.dump({'target': target, 'builds': published}, manifest_file,
+                  indent=4)
+
+    for module in MODULE_NAMES:
+        Path(target, 'schema', module).mkdir(parents=True, exist_ok=True)
+        subprocess.run(COPY + [f'./node_modules/@gros/{module}/schema/',
+                               f'{target}/schema/{module}'], check=True)
+
+    download_branches(config, target)
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -38,23 +38,14 @@ function version() {
 COMPOSE_ARGS="-p ${BUILD_TAG:-visualization} -f caddy/docker-compose.yml -f test/docker-compose.yml"
 
 function container_logs() {
-	echo $'<h2>Docker container logs</h2>\n<ul>' >> test/results/index.html
-
-	docker compose $COMPOSE_ARGS ps -aq | xargs -L 1 -I {} /bin/bash -c '
-		host=$(docker inspect --format="{{index .Config.Labels \"com.docker.compose.service\"}}.{{.Config.Domainname}}" {})
-		state=$(docker inspect --format="{{.State.Status}}" {})
-		docker inspect --format="$(cat log-format.txt)" {} > test/results/logs_$host.html
-		echo "<pre>" >> test/results/logs_$host.html
-		docker logs {} 2>&1 | sed "s/&/\&amp;/g; s/</\&lt;/g; s/>/\&gt;/g" >> test/results/logs_$host.html 2>&1
-		echo -e "</pre>\n</body>\n</html>" >> test/results/logs_$host.html
-		echo "<li><a href=\"logs_$host.html\" title=\"Logs for $(docker inspect --format={{.Name}} {})\">$host ($(docker logs {} 2>&1 | wc -c) bytes, end state: $state)</a></li>" >> test/results/index.html'
-
-	echo $'</ul>\n</body>\n</html>' >> test/results/index.html
+	# Collect the logs of all containers concurrently, with only the end of
+	# large logs, and list them in the results index
+	python3 test/container_logs.py --format log-format.txt --output test/results --index test/results/index.html $(docker compose $COMPOSE_ARGS ps -aq)
 }
 
-rm -rf test/junit test/results test/accessibility test/coverage test/downloads test/owasp-dep
+rm -rf test/junit test/results test/accessibility test/coverage test/downloads test/owasp-dep test/benchmark test/load test/replay
 mkdir -p repos
-mkdir -p test/junit test/results test/accessibility test/coverage/output test/downloads
+mkdir -p test/junit test/results test/accessibility test/coverage/output test/downloads test/benchmark/results test/load/results
 mkdir -p -m 0777 "$HOME/OWASP-Dependency-Check/data/cache"
 mkdir -p -m 0777 test/owasp-dep
 
@@ -68,6 +59,10 @@ if [ -z "$VISUALIZATION_NAMES" ]; then
 	VISUALIZATION_NAMES=$(cat visualization_names.txt)
 fi
 
+if [ -z "$VISUALIZATION_SAMPLE_ROOT" ]; then
+	VISUALIZATION_SAMPLE_ROOT="test/sample"
+fi
+
 VISUALIZATION_ENV=$(env -i VISUALIZATION_ORGANIZATION=$VISUALIZATION_ORGANIZATION VISUALIZATION_COMBINED=$VISUALIZATION_COMBINED)
 
 function reset_modules_volume() {
@@ -106,24 +101,17 @@ function update_repo() {
 			GIT_DIR="$tree/.git" GIT_WORK_TREE=$tree git rm .gitattributes
 			GIT_DIR="$tree/.git" GIT_WORK_TREE=$tree git add -A
 		fi
-		if [ -f "$tree/.skip_build" ]; then
-			previous_env=$(cat "$tree/.skip_build")
-		else
-			previous_env="no previous build"
-		fi
 		GIT_DIR="$tree/.git" GIT_WORK_TREE=$tree git reset --hard
 		GIT_DIR="$tree/.git" GIT_WORK_TREE=$tree git remote set-url origin $url
 		GIT_DIR="$tree/.git" GIT_WORK_TREE=$tree git fetch origin master
 		LOCAL_REV=$(GIT_DIR="$tree/.git" GIT_WORK_TREE=$tree git rev-parse HEAD)
 		REMOTE_REV=$(GIT_DIR="$tree/.git" GIT_WORK_TREE=$tree git rev-parse FETCH_HEAD)
-		if [ ! -z "$repo" ] && [ $LOCAL_REV = $REMOTE_REV ] && [ "$VISUALIZATION_ENV" = "$previous_env" ] && [ ! -z $(docker volume ls -q -f "name=^$BRANCH_NAME-$repo-modules$") ]; then
-			echo "$repo is up to date, skipping build in instance."
-			echo "$VISUALIZATION_ENV" > "$tree/.skip_build"
+		if [ ! -z "$repo" ] && [ $LOCAL_REV = $REMOTE_REV ] && [ ! -z $(docker volume ls -q -f "name=^$BRANCH_NAME-$repo-modules$") ]; then
+			echo "$repo is up to date."
 		else
 			GIT_DIR="$tree/.git" GIT_WORK_TREE=$tree git pull origin master
 			if [ ! -z "$repo" ]; then
-				echo "Build of $repo required"
-				rm -f "$tree/.skip_build"
+				echo "Update of $repo requires new modules"
 				reset_modules_volume "$repo"
 			fi
 		fi
@@ -144,7 +132,6 @@ if [ -d "$PWD/$REPO_ROOT/prediction-site" ]; then
 	if [ $? -ne 0 ]; then
 		echo "Including new configuration file for prediction-site (rebuild)"
 		cp -f --no-preserve=mode,ownership test/prediction-config.json "$tree/config.json"
-		rm -f "$tree/.skip_build"
 	fi
 	rm -rf "$tree/test"
 	mkdir -p "$tree/test/junit" "$tree/test/coverage/output" "$tree/test/suite"
@@ -154,6 +141,14 @@ fi
 PROXY_HOST=proxy
 
 docker compose $COMPOSE_ARGS pull
+
+# Use cached builds of visualizations whose build inputs are unchanged
+for repo in $VISUALIZATION_NAMES; do
+	tree="$PWD/$REPO_ROOT/$repo"
+	image=$(docker image inspect --format "{{.Id}}" "$DOCKER_REPOSITORY/gros-$repo:latest" 2>/dev/null)
+	python3 test/build_cache.py restore "$tree" --sample "$VISUALIZATION_SAMPLE_ROOT/$repo" --extra "$VISUALIZATION_ENV" --extra "$image"
+done
+
 docker compose $COMPOSE_ARGS up -d --force-recreate
 
 TEST_CONTAINER=$(docker compose $COMPOSE_ARGS ps -q runner)
@@ -170,7 +165,7 @@ docker exec $TEST_CONTAINER pip install -r /work/requirements.txt
 if [ -z "$VISUALIZATION_MAX_SECONDS" ]; then
 	VISUALIZATION_MAX_SECONDS=60
 fi
-seconds=0
+containers=""
 for name in $VISUALIZATION_NAMES; do
 	container=$(docker compose $COMPOSE_ARGS ps -aq $name)
 	if [ -z "$container" ]; then
@@ -180,45 +175,67 @@ for name in $VISUALIZATION_NAMES; do
 		echo "Could not find instance for $name." >&2
 		exit 1
 	fi
+	containers="$containers $name=$container"
+done
 
-	running="true"
-	while [ "$running" == "true" ]; do
-		if [ $seconds -gt $VISUALIZATION_MAX_SECONDS ]; then
-			container_logs
-			docker compose $COMPOSE_ARGS down
-			echo "$name did not seem to be done after ${VISUALIZATION_MAX_SECONDS}s." >&2
-			exit 1
-		fi
-
-		# Check if the visualization is done building
-		running=$(docker inspect -f '{{.State.Running}}' $container 2>&1)
-		exitcode=$?
-		if [ $exitcode -ne 0 ]; then
-			echo "$running" >&2
+# Wait for all visualizations to be done building, using container events.
+# In pipelined mode, tests start right away and wait for their visualization.
+readiness=""
+if [ ! -z "$containers" ]; then
+	python3 test/readiness.py --timeout $VISUALIZATION_MAX_SECONDS --output test/results/builds.json $containers &
+	readiness=$!
+	if [ "$VISUALIZATION_TEST_PIPELINE" != "true" ]; then
+		wait $readiness
+		if [ $? -ne 0 ]; then
 			container_logs
 			docker compose $COMPOSE_ARGS down
-			echo "An error occured while waiting for $name to be done." >&2
 			exit 1
 		fi
-		if [ "$running" == "true" ]; then
-			echo "Waiting for $name to be done ($((VISUALIZATION_MAX_SECONDS-seconds))s remaining)"
-			seconds=$((seconds+1))
-			sleep 1
-		fi
-	done
-done
+		readiness=""
+	fi
+fi
 echo "Starting test"
 
 docker exec -u `id -u`:`id -g` $TEST_CONTAINER python /work/test.py -v
 status=$?
 
+if [ ! -z "$readiness" ]; then
+	wait $readiness
+	if [ $? -ne 0 ]; then
+		container_logs
+		docker compose $COMPOSE_ARGS down
+		exit 1
+	fi
+fi
+
+# Benchmark the sprint report formats with generated data of several scales
+if [ ! -z "$VISUALIZATION_BENCHMARK" ] && [[ " $VISUALIZATION_NAMES " == *" sprint-report "* ]]; then
+	tree="$PWD/$REPO_ROOT/sprint-report"
+	for scale in $VISUALIZATION_BENCHMARK; do
+		python3 test/sprint_report_data.py "$tree/public/data" --projects "${scale%x*}" --sprints "${scale#*x}"
+		docker exec -u `id -u`:`id -g` $TEST_CONTAINER python /work/benchmark.py --scale "$scale"
+	done
+	python3 test/benchmark_report.py
+fi
+
+# Load test the proxy with a mix of hub, data, download and control requests
+if [ ! -z "$VISUALIZATION_LOAD_TEST" ]; then
+	docker exec -u `id -u`:`id -g` $TEST_CONTAINER python /work/load_test.py --duration "$VISUALIZATION_LOAD_TEST" --concurrency "${VISUALIZATION_LOAD_CONCURRENCY:-10}"
+	python3 test/load_report.py
+fi
+
+# Replay recorded traffic from the access logs against the proxy
+if [ ! -z "$VISUALIZATION_REPLAY_LOGS" ]; then
+	docker exec -u `id -u`:`id -g` $TEST_CONTAINER python /work/log_replay.py /logs --rate "${VISUALIZATION_REPLAY_RATE:-1}" --output replay/results.json
+fi
+
 container_logs
 docker compose $COMPOSE_ARGS down
 
-# Note the successful build with the environment used to build it
+# Store the successful builds with the inputs used to build them
 for repo in $VISUALIZATION_NAMES; do
 	tree="$PWD/$REPO_ROOT/$repo"
-	echo "$VISUALIZATION_ENV" > "$tree/.skip_build"
+	python3 test/build_cache.py store "$tree" --builds test/results/builds.json
 done
 
 echo "# Let SonarQube know we have Python tests" > lib/test.py
@@ -0,0 +1,65 @@
+"""
+Entry point for the benchmark of the sprint report formats.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from argparse import ArgumentParser
+import sys
+import unittest
+from suite.base import IntegrationTest
+from suite.benchmark import SprintReportBenchmark
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+
+    parser = ArgumentParser(description='Benchmark sprint report formats')
+    parser.add_argument('--scale', default='default',
+                        help='Name of the scale of the data under test')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of times to measure each format')
+    parser.add_argument('--selected', type=int, default=1,
+                        help='Number of projects to select')
+    parser.add_argument('--output', default='benchmark/results',
+                        help='Directory to write the timings to')
+    return parser.parse_args()
+
+def main():
+    """
+    Main entry point.
+    """
+
+    args = parse_args()
+    SprintReportBenchmark.scale = args.scale
+    SprintReportBenchmark.repeat = args.repeat
+    SprintReportBenchmark.selected = args.selected
+    SprintReportBenchmark.output = args.output
+
+    tests = unittest.defaultTestLoader.loadTestsFromTestCase(
+        SprintReportBenchmark
+    )
+    try:
+        result = unittest.TextTestRunner(verbosity=2).run(tests)
+    finally:
+        IntegrationTest.sessions.close()
+
+    return 0 if result.wasSuccessful() else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,160 @@
+"""
+Combine benchmark results of the sprint report formats into a trend report.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime
+import html
+import json
+import os
+from pathlib import Path
+from statistics import median
+import sys
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+
+    parser = ArgumentParser(description='Create benchmark trend report')
+    parser.add_argument('--results', default='test/benchmark/results',
+                        help='Directory with timings of the current run')
+    parser.add_argument('--output', default='test/benchmark',
+                        help='Directory to write the trend report to')
+    parser.add_argument('--history', default=os.getenv(
+        'VISUALIZATION_BENCHMARK_HISTORY',
+        str(Path.home() / '.cache' / 'visualization-site' / 'benchmark.json')
+    ), help='JSON file with the results of earlier runs')
+    parser.add_argument('--keep', type=int, default=20,
+                        help='Number of runs to keep in the history')
+    return parser.parse_args()
+
+def summarize(timings):
+    """
+    Determine the median latencies of the measurements of each format.
+    Measurements that did not finish in time are left out.
+    """
+
+    summary = {}
+    for name, timing in timings.items():
+        summary[name] = {}
+        for kind, values in timing.items():
+            finished = [value for value in values if value is not None]
+            summary[name][kind] = median(finished) if finished else None
+
+    return summary
+
+def read_run(results):
+    """
+    Read the timings of the current run for each scale.
+    """
+
+    scales = {}
+    for path in sorted(Path(results).glob('*.json')):
+        with open(path, 'r', encoding='utf-8') as result_file:
+            result = json.load(result_file)
+        scales[result['scale']] = summarize(result['formats'])
+
+    return {
+        'build': os.getenv('BUILD_NUMBER', ''),
+        'branch': os.getenv('BRANCH_NAME', ''),
+        'started': datetime.now().astimezone().isoformat(),
+        'scales': scales
+    }
+
+def format_change(value, previous):
+    """
+    Format a latency with its relative change compared to the previous run.
+    """
+
+    if value is None:
+        return 'n/a'
+    if previous is None or previous == 0:
+        return f'{value:.0f}'
+
+    return f'{value:.0f} ({(value - previous) / previous:+.0%})'
+
+def write_report(runs, output):
+    """
+    Write an HTML table for each scale with the median latencies of the
+    formats in the kept runs, with the current run last.
+    """
+
+    scales = runs[-1]['scales']
+    with open(Path(output) / 'index.html', 'w', encoding='utf-8') as report:
+        report.write('<!doctype html>\n<html>\n<head>\n')
+        report.write('<meta charset="utf-8">\n')
+        report.write('<title>Sprint report benchmark</title>\n')
+        report.write('<style>table,th,td { border: .1rem solid #aaa; '
+                     'border-collapse: collapse }</style>\n')
+        report.write('</head>\n<body>\n<h1>Sprint report benchmark</h1>\n')
+        report.write('<p>Median latency in milliseconds of rendering each '
+                     'format and of an interaction within it, with the change '
+                     'compared to the previous run.</p>\n')
+        for scale, formats in scales.items():
+            history = [run for run in runs if scale in run['scales']]
+            report.write(f'<h2>{html.escape(scale)}</h2>\n<table>\n<tr>')
+            report.write('<th>Format</th><th>Latency</th>')
+            for run in history:
+                label = html.escape(f"{run['build'] or run['started']}")
+                report.write(f'<th>{label}</th>')
+            report.write('</tr>\n')
+            for name, kinds in formats.items():
+                for kind in kinds:
+                    report.write(f'<tr><td>{name}</td><td>{kind}</td>')
+                    previous = None
+                    for run in history:
+                        value = run['scales'][scale].get(name, {}).get(kind)
+                        report.write(f'<td>{format_change(value, previous)}</td>')
+                        previous = value
+                    report.write('</tr>\n')
+            report.write('</table>\n')
+
+        report.write('</body>\n</html>')
+
+def main():
+    """
+    Main entry point.
+    """
+
+    args = parse_args()
+    run = read_run(args.results)
+    if not run['scales']:
+        print(f'No benchmark results found in {args.results}', file=sys.stderr)
+        return 1
+
+    try:
+        with open(args.history, 'r', encoding='utf-8') as history_file:
+            runs = json.load(history_file)
+    except FileNotFoundError:
+        runs = []
+
+    runs = (runs + [run])[-args.keep:]
+    Path(args.history).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.history, 'w', encoding='utf-8') as history_file:
+        json.dump(runs, history_file)
+
+    with open(Path(args.output) / 'trend.json', 'w',
+              encoding='utf-8') as trend_file:
+        json.dump(runs, trend_file, indent=4)
+    write_report(runs, args.output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,205 @@
+"""
+Content-addressed cache of visualization builds for the test environment.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from argparse import ArgumentParser
+import hashlib
+import json
+import os
+from pathlib import Path
+import shutil
+import subprocess
+import sys
+import tempfile
+
+# Marker file which makes the build instance skip the build.
+SKIP_BUILD = '.skip_build'
+
+# File in the repository that holds the cache key of the current inputs.
+BUILD_KEY = '.build_key'
+
+# Paths in the repository that are not inputs of the build.
+EXCLUDE = (SKIP_BUILD, BUILD_KEY, 'public', 'node_modules', 'node_modules.bak')
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+
+    parser = ArgumentParser(description='Cache visualization builds')
+    parser.add_argument('action', choices=('restore', 'store'),
+                        help='Restore a cached build or store a new build')
+    parser.add_argument('tree', help='Path to the visualization repository')
+    parser.add_argument('--cache', default=os.getenv(
+        'VISUALIZATION_BUILD_CACHE',
+        str(Path.home() / '.cache' / 'visualization-site' / 'builds')
+    ), help='Directory to store cached builds in')
+    parser.add_argument('--size', type=int, default=int(os.getenv(
+        'VISUALIZATION_BUILD_CACHE_SIZE', '20'
+    )), help='Maximum number of cached builds to keep')
+    parser.add_argument('--sample', default=None,
+                        help='Directory with sample data used by the build')
+    parser.add_argument('--extra', action='append', default=[],
+                        help='Additional input of the build, e.g. environment')
+    parser.add_argument('--builds', default='test/results/builds.json',
+                        help='JSON file with build timings and exit codes')
+    return parser.parse_args()
+
+def tree_hash(tree):
+    """
+    Determine a Git tree hash of the current contents of a repository,
+    including uncommitted changes but excluding ignored files and build
+    outputs.
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+        index = Path(directory) / 'index'
+        # Reuse the stat information of the repository index, if possible
+        if (Path(tree) / '.git' / 'index').exists():
+            shutil.copyfile(Path(tree) / '.git' / 'index', index)
+
+        env = dict(os.environ, GIT_INDEX_FILE=str(index))
+        subprocess.run(['git', 'add', '-A'], cwd=tree, env=env, check=True)
+        subprocess.run(['git', 'rm', '-r', '-q', '--cached', '--ignore-unmatch',
+                        '--'] + list(EXCLUDE), cwd=tree, env=env, check=True)
+        return subprocess.check_output(['git', 'write-tree'], cwd=tree,
+                                       env=env, universal_newlines=True).strip()
+
+def directory_hash(path):
+    """
+    Determine a hash of the names and contents of the files in a directory.
+    """
+
+    digest = hashlib.sha256()
+    for filename in sorted(Path(path).rglob('*')):
+        if filename.is_file():
+            digest.update(str(filename.relative_to(path)).encode('utf-8'))
+            digest.update(b'\0')
+            digest.update(hashlib.sha256(filename.read_bytes()).digest())
+
+    return digest.hexdigest()
+
+def build_key(args):
+    """
+    Determine the cache key for the inputs of a visualization build.
+    """
+
+    inputs = [tree_hash(args.tree)]
+    # The configuration may be placed in the repository without tracking it
+    config = Path(args.tree) / 'config.json'
+    if config.exists():
+        inputs.append(hashlib.sha256(config.read_bytes()).hexdigest())
+    if args.sample is not None and Path(args.sample).is_dir():
+        inputs.append(directory_hash(args.sample))
+    inputs.extend(args.extra)
+
+    return hashlib.sha256('\n'.join(inputs).encode('utf-8')).hexdigest()
+
+def restore(args):
+    """
+    Place a cached build in the public directory of the repository if one
+    exists for the current inputs, and mark the build to be skipped.
+    """
+
+    tree = Path(args.tree)
+    key = build_key(args)
+    (tree / BUILD_KEY).write_text(key, encoding='utf-8')
+
+    name = tree.name
+    entry = Path(args.cache) / key
+    if not entry.is_dir():
+        print(f'Build of {name} required')
+        if (tree / SKIP_BUILD).exists():
+            (tree / SKIP_BUILD).unlink()
+        return 0
+
+    print(f'{name} is cached, skipping build in instance.')
+    public = tree / 'public'
+    shutil.rmtree(public, ignore_errors=True)
+    shutil.copytree(entry, public)
+    # Mark the entry as recently used
+    os.utime(entry)
+    (tree / SKIP_BUILD).write_text(key, encoding='utf-8')
+    return 0
+
+def evict(cache, size):
+    """
+    Remove the least recently used builds from the cache such that at most
+    `size` builds remain.
+    """
+
+    entries = sorted((entry for entry in Path(cache).iterdir()
+                      if entry.is_dir() and not entry.name.endswith('.tmp')),
+                     key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in entries[size:]:
+        shutil.rmtree(entry, ignore_errors=True)
+
+def store(args):
+    """
+    Store the build outputs of a visualization in the cache, if the build
+    was performed and was successful.
+    """
+
+    tree = Path(args.tree)
+    name = tree.name
+    if (tree / SKIP_BUILD).exists() or not (tree / BUILD_KEY).exists():
+        return 0
+
+    try:
+        with open(args.builds, 'r', encoding='utf-8') as builds_file:
+            builds = json.load(builds_file)
+    except FileNotFoundError:
+        builds = {}
+    if builds.get(name, {}).get('exit_code') != 0:
+        print(f'Not caching unsuccessful build of {name}')
+        return 0
+
+    key = (tree / BUILD_KEY).read_text(encoding='utf-8').strip()
+    entry = Path(args.cache) / key
+    temp = Path(args.cache) / f'{key}.tmp'
+    if not entry.exists():
+        Path(args.cache).mkdir(parents=True, exist_ok=True)
+        shutil.rmtree(temp, ignore_errors=True)
+        # Sample data is placed in the public directory by the instance
+        shutil.copytree(tree / 'public', temp,
+                        ignore=lambda path, names: ['data']
+                        if Path(path) == tree / 'public' else [])
+        try:
+            os.replace(temp, entry)
+            print(f'Cached build of {name}')
+        except OSError:
+            # Another job stored the same build in the meantime
+            shutil.rmtree(temp, ignore_errors=True)
+
+    evict(args.cache, args.size)
+    return 0
+
+def main():
+    """
+    Main entry point.
+    """
+
+    args = parse_args()
+    if args.action == 'restore':
+        return restore(args)
+
+    return store(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Collect the logs of the Docker containers of the test environment.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+import codecs
+import html
+import json
+import os
+from pathlib import Path
+import subprocess
+import sys
+
+# Size of the chunks in which logs are read and written.
+CHUNK_SIZE = 64 * 1024
+
+# Separator between the inspected information of a container and its log
+# header, and after the header, which cannot occur in either of them, with
+# the template action that outputs it.
+SEPARATOR = '\0'
+SEPARATOR_ACTION = '{{"\\x00"}}'
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+
+    parser = ArgumentParser(description='Collect Docker container logs')
+    parser.add_argument('containers', nargs='*', metavar='CONTAINER',
+                        help='IDs of the containers to collect logs from')
+    parser.add_argument('--format', default='log-format.txt',
+                        help='Docker inspect template for the log header')
+    parser.add_argument('--output', default='test/results',
+                        help='Directory to write the log pages to')
+    parser.add_argument('--index', default=None,
+                        help='HTML file to append the log entries to')
+    parser.add_argument('--max-bytes', type=int, default=int(os.getenv(
+        'VISUALIZATION_LOG_MAX_BYTES', str(1024 * 1024)
+    )), help='Maximum size of a log, of which only the end is kept')
+    parser.add_argument('--workers', type=int, default=8,
+                        help='Number of containers to collect concurrently')
+    return parser.parse_args()
+
+def read_tail(container_id, max_bytes):
+    """
+    Read the combined output and error logs of a container. Returns the last
+    `max_bytes` of the log and the total size of the log in bytes.
+    """
+
+    with subprocess.Popen(['docker', 'logs', container_id],
+                          stdout=subprocess.PIPE,
+                          stderr=subprocess.STDOUT) as process:
+        tail = bytearray()
+        size = 0
+        for chunk in iter(lambda: process.stdout.read(CHUNK_SIZE), b''):
+            size += len(chunk)
+            tail.extend(chunk)
+            if len(tail) > max_bytes:
+                del tail[:len(tail) - max_bytes]
+
+    if size > len(tail):
+        # Start the truncated log at a complete line, if there is one
+        newline = tail.find(b'\n')
+        if newline != -1:
+            del tail[:newline + 1]
+
+    return bytes(tail), size
+
+def inspect(container_ids, template):
+    """
+    Inspect the containers with one Docker command, which also renders the
+    log header `template` for each of them. Returns a list of `ContainerLog`
+    objects.
+    """
+
+    output = subprocess.check_output([
+        'docker', 'inspect', '--format',
+        '{{json .}}' + SEPARATOR_ACTION + template + SEPARATOR_ACTION
+    ] + container_ids, universal_newlines=True)
+
+    containers = []
+    for item in output.split(f'{SEPARATOR}\n')[:-1]:
+        info, header = item.split(SEPARATOR, 1)
+        containers.append(ContainerLog(json.loads(info), header))
+
+    return containers
+
+class ContainerLog:
+    """
+    Log page of a Docker container.
+    """
+
+    def __init__(self, info, header):
+        self._id = info['Id']
+        labels = info['Config'].get('Labels') or {}
+        service = labels.get('com.docker.compose.service', '')
+        self.host = f"{service}.{info['Config'].get('Domainname', '')}"
+        self.name = info['Name']
+        self.state = info['State']['Status']
+        self._header = header
+        self.size = 0
+        self.kept = 0
+
+    def write(self, directory, max_bytes):
+        """
+        Write the log page of the container to the `directory`, with the end
+        of the log up to `max_bytes` escaped in chunks.
+        """
+
+        tail, self.size = read_tail(self._id, max_bytes)
+        self.kept = len(tail)
+
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        path = Path(directory) / f'logs_{self.host}.html'
+        with path.open('w', encoding='utf-8') as log_file:
+            log_file.write(self._header)
+            if self.truncated:
+                log_file.write(f'<p>Only the last {self.kept} bytes of '
+                               f'{self.size} bytes are shown.</p>\n')
+            log_file.write('<pre>\n')
+            for start in range(0, len(tail), CHUNK_SIZE):
+                text = decoder.decode(tail[start:start + CHUNK_SIZE])
+                log_file.write(html.escape(text, quote=False))
+            log_file.write(html.escape(decoder.decode(b'', final=True),
+                                       quote=False))
+            log_file.write('</pre>\n</body>\n</html>\n')
+
+    @property
+    def truncated(self):
+        """
+        Whether the log page only has the end of the log.
+        """
+
+        return self.size > self.kept
+
+    def entry(self):
+        """
+        Format an entry for the log page in the results index.
+        """
+
+        size = f'{self.size} bytes'
+        if self.truncated:
+            size += f', last {self.kept} shown'
+        return f'<li><a href="logs_{self.host}.html" ' + \
+            f'title="Logs for {html.escape(self.name)}">' + \
+            f'{self.host} ({size}, end state: {self.state})</a></li>\n'
+
+def main():
+    """
+    Main entry point.
+    """
+
+    args = parse_args()
+    with open(args.format, 'r', encoding='utf-8') as template_file:
+        template = template_file.read()
+
+    status = 0
+    containers = []
+    entries = []
+    if args.containers:
+        try:
+            containers = inspect(args.containers, template)
+        except (OSError, subprocess.CalledProcessError) as error:
+            print(f'Could not inspect containers: {error}', file=sys.stderr)
+            entries.append('<li>Could not inspect containers: ' +
+                           f'{html.escape(str(error))}</li>\n')
+            status = 1
+
+    with ThreadPoolExecutor(max_workers=args.workers) as executor:
+        futures = [
+            executor.submit(container.write, args.output, args.max_bytes)
+            for container in containers
+        ]
+
+    for container, future in zip(containers, futures):
+        error = future.exception()
+        if error is None:
+            entries.append(container.entry())
+        else:
+            print(f'Could not collect logs of {container.host}: {error}',
+                  file=sys.stderr)
+            entries.append(f'<li>{container.host} (no logs: ' +
+                           f'{html.escape(str(error))}, ' +
+                           f'end state: {container.state})</li>\n')
+
+    if args.index is not None:
+        with open(args.index, 'a', encoding='utf-8') as index_file:
+            index_file.write('<h2>Docker container logs</h2>\n<ul>\n')
+            index_file.writelines(entries)
+            index_file.write('</ul>\n</body>\n</html>\n')
+
+    return status
+
+if __name__ == "__main__":
+    sys.exit(main())
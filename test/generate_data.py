@@ -0,0 +1,638 @@
+"""
+Generate sample data for the visualizations from the JSON schemas.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from argparse import ArgumentParser
+from collections import defaultdict
+from datetime import datetime, timedelta
+from functools import lru_cache
+import hashlib
+import json
+import os
+from pathlib import Path
+import random
+import re
+import shutil
+import string
+import sys
+from urllib.parse import urldefrag, urljoin
+from sprint_report_data import data_files as sprint_report_files, \
+    import_validate_data, write_projects
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+
+    parser = ArgumentParser(description='Generate sample data from schemas')
+    parser.add_argument('output', help='Directory to write the sample data to')
+    parser.add_argument('--scale', type=int, default=10,
+                        help='Number of entries in top-level collections, '
+                        'such as projects, members or sprints')
+    parser.add_argument('--levels', type=int, default=1,
+                        help='Number of nested collection levels that have '
+                        'the scaled number of entries')
+    parser.add_argument('--width', type=int, default=3,
+                        help='Maximum number of entries in deeper collections')
+    parser.add_argument('--sprints', type=int, default=10,
+                        help='Number of entries in top-level collections of '
+                        'files of each project, such as sprints')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for the random number generator')
+    parser.add_argument('--schema', default='schema',
+                        help='Directory with the JSON schemas')
+    parser.add_argument('--sample', default='test/sample',
+                        help='Directory with the sample data layout')
+    parser.add_argument('--samples', default='test/schema-samples.json',
+                        help='JSON file with sample paths and their schemas')
+    parser.add_argument('--visualization', action='append', default=[],
+                        help='Only generate data for this visualization')
+    parser.add_argument('--validate', action='store_true', default=False,
+                        help='Validate the generated data against the schemas')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                        help='Number of processes to validate files with')
+    return parser.parse_args()
+
+# Characters used for wildcards and negated character classes in patterns.
+ALPHABET = string.ascii_letters + string.digits
+
+# Number of repetitions for unbounded quantifiers in patterns.
+REPEAT = (4, 10)
+
+# Characters of escape sequences in patterns, other than escaped literals.
+ESCAPES = {'d': string.digits, 's': ' ', 'w': ALPHABET + '_'}
+
+# Bounds of quantifiers in patterns, with `None` for unbounded repetition.
+QUANTIFIERS = {'?': (0, 1), '*': (0, None), '+': (1, None)}
+
+def _parse_class(pattern, index):
+    # Parse a character class after its opening bracket. Returns the choices
+    # of characters and the index after the class.
+    negate = pattern[index] == '^'
+    if negate:
+        index += 1
+    choices = []
+    while pattern[index] != ']':
+        char = pattern[index]
+        if char == '\\':
+            choices.extend(ESCAPES.get(pattern[index + 1], pattern[index + 1]))
+            index += 2
+        elif pattern[index + 1] == '-' and pattern[index + 2] != ']':
+            choices.extend(chr(code) for code in
+                           range(ord(char), ord(pattern[index + 2]) + 1))
+            index += 3
+        else:
+            choices.append(char)
+            index += 1
+
+    if negate:
+        choices = [char for char in ALPHABET if char not in choices]
+    return ''.join(choices), index + 1
+
+def _parse_quantifier(pattern, index):
+    # Parse an optional quantifier. Returns the minimum and maximum number of
+    # repetitions and the index after the quantifier.
+    if index < len(pattern) and pattern[index] in QUANTIFIERS:
+        low, high = QUANTIFIERS[pattern[index]]
+        index += 1
+    elif pattern.startswith('{', index):
+        end = pattern.index('}', index)
+        low, comma, high = pattern[index + 1:end].partition(',')
+        if not comma:
+            high = low
+        low, high = int(low), (int(high) if high else None)
+        index = end + 1
+    else:
+        return 1, 1, index
+
+    if high is None:
+        low, high = max(low, REPEAT[0]), max(low, REPEAT[1])
+    return low, high, index
+
+def _parse_alternatives(pattern, index=0):
+    # Parse alternatives of sequences of atoms until the end of the pattern
+    # or a group. Each atom is a string of characters to choose from or the
+    # alternatives of a group, with its number of repetitions. Anchors and
+    # lookahead assertions are left out and checked afterward.
+    alternatives = [[]]
+    while index < len(pattern) and pattern[index] != ')':
+        char = pattern[index]
+        index += 1
+        if char == '|':
+            alternatives.append([])
+            continue
+        if char in '^$':
+            continue
+
+        if char == '(':
+            assertion = pattern.startswith('?', index) and \
+                not pattern.startswith('?:', index)
+            if pattern.startswith('?', index):
+                index += 2
+            atom, index = _parse_alternatives(pattern, index)
+            index += 1
+            if assertion:
+                continue
+        elif char == '[':
+            atom, index = _parse_class(pattern, index)
+        elif char == '\\':
+            atom = ESCAPES.get(pattern[index], pattern[index])
+            index += 1
+        else:
+            atom = ALPHABET if char == '.' else char
+
+        low, high, index = _parse_quantifier(pattern, index)
+        alternatives[-1].append((atom, low, high))
+
+    return alternatives, index
+
+@lru_cache(maxsize=None)
+def _parse_pattern(pattern):
+    return _parse_alternatives(pattern)[0]
+
+def _pattern_tokens(rng, alternatives):
+    parts = []
+    for atom, low, high in rng.choice(alternatives):
+        for _ in range(rng.randint(low, high)):
+            if isinstance(atom, str):
+                parts.append(rng.choice(atom))
+            else:
+                parts.append(_pattern_tokens(rng, atom))
+
+    return ''.join(parts)
+
+def generate_pattern(rng, pattern, used=None, tries=100):
+    """
+    Generate a string that matches the regular expression `pattern` and is not
+    in `used`. Returns `None` if no such string was found. Patterns may use
+    literals, escapes, character classes, groups, alternatives, quantifiers,
+    anchors and lookahead assertions, like those of the schemas.
+    """
+
+    tokens = _parse_pattern(pattern)
+    for _ in range(tries):
+        value = _pattern_tokens(rng, tokens)
+        if re.search(pattern, value) and (used is None or value not in used):
+            return value
+
+    return None
+
+class SchemaData:
+    """
+    Generator of data that conforms to JSON schemas.
+    """
+
+    # Start of the period of generated dates.
+    EPOCH = datetime(2001, 1, 1, 12, 0, 0)
+
+    # Generators of strings with a format.
+    FORMATS = {
+        'date': lambda self, hint: self.moment().strftime('%Y-%m-%d'),
+        'date-time': lambda self, hint: self.moment().isoformat() + 'Z',
+        'hostname': lambda self, hint: f'{self.name(hint)}.example',
+        'ipv4': lambda self, hint: '.'.join(
+            str(self.random.randint(1, 254)) for _ in range(4)
+        ),
+        'ipv6': lambda self, hint: f'fd00::{self.random.randint(1, 65535):x}',
+        'regex': lambda self, hint: '.*',
+        'uri': lambda self, hint: f'https://www.example/{self.name(hint)}',
+        'uri-reference': lambda self, hint: f'/{self.name(hint)}'
+    }
+
+    # Names of number properties that hold counts or identifiers, which are
+    # generated as integers.
+    COUNTS = re.compile(r'^(num_|future_)|^team$|_(count|id)$')
+
+    # Number of times to generate each alternative of a `oneOf` for a value
+    # that is not valid under the other alternatives.
+    TRIES = 10
+
+    def __init__(self, schemas, scale=10, levels=1, width=3):
+        self._schemas = schemas
+        self._resolved = {}
+        self._scale = scale
+        self._levels = levels
+        self._width = width
+        self.random = random.Random()
+        self._names = defaultdict(int)
+
+    def resolve(self, reference, base):
+        """
+        Retrieve the schema that a reference points to, relative to the URI of
+        the schema that contains the reference. Returns the schema and its
+        base URI.
+        """
+
+        if (reference, base) not in self._resolved:
+            uri = urljoin(base, reference)
+            self._resolved[reference, base] = (self._schemas.lookup(uri),
+                                               urldefrag(uri)[0])
+
+        return self._resolved[reference, base]
+
+    def name(self, hint):
+        """
+        Generate a readable identifier based on a hint, such as the name of
+        the property that the value is for.
+        """
+
+        hint = re.sub(r'[^a-z0-9]', '', hint.lower()) or 'item'
+        self._names[hint] += 1
+        return f'{hint}{self._names[hint]}'
+
+    def moment(self):
+        """
+        Generate a date and time within a few years after the epoch.
+        """
+
+        return self.EPOCH + timedelta(seconds=self.random.randint(0, 10**8))
+
+    def _count(self, schema, depth):
+        if depth < self._levels:
+            count = self._scale
+        else:
+            count = self.random.randint(1, self._width)
+
+        count = max(count, schema.get('minItems', 0))
+        return min(count, schema.get('maxItems', count))
+
+    def _string(self, schema, hint):
+        if 'pattern' in schema:
+            value = generate_pattern(self.random, schema['pattern'])
+            if value is not None:
+                return value
+
+        if schema.get('format') in self.FORMATS:
+            return self.FORMATS[schema['format']](self, hint)
+
+        return self.name(hint)
+
+    def _number(self, schema, hint):
+        low = schema.get('minimum', 0)
+        high = schema.get('maximum', low + 100)
+        if schema.get('type') == 'integer' or self.COUNTS.search(hint):
+            return self.random.randint(int(low), int(high))
+
+        return round(self.random.uniform(low, high), 2)
+
+    def _object(self, schema, base, depth, hint):
+        value = {}
+        for name, subschema in schema.get('properties', {}).items():
+            value[name] = self.value(subschema, base, depth, name)
+
+        patterns = list(schema.get('patternProperties', {}).items())
+        additional = schema.get('additionalProperties')
+        if isinstance(additional, dict):
+            patterns.append(('^.+$', additional))
+        for pattern, subschema in patterns:
+            for _ in range(self._count(schema, depth)):
+                if pattern in ('^.+$', '.*', '.+'):
+                    key = self.name(hint)
+                else:
+                    key = generate_pattern(self.random, pattern, used=value)
+                    if key is None:
+                        break
+                value[key] = self.value(subschema, base, depth + 1, key)
+
+        return value
+
+    def _array(self, schema, base, depth, hint):
+        prefix = schema.get('prefixItems', [])
+        count = max(self._count(schema, depth), len(prefix))
+        return [
+            self.value(prefix[index] if index < len(prefix) else
+                       schema.get('items', {}), base, depth + 1, hint)
+            for index in range(count)
+        ]
+
+    def _combined(self, schema, base, depth, hint):
+        # Generate values for the reference, the subschemas and the other
+        # keywords, and combine them if they are objects
+        parts = [self.resolve(schema['$ref'], base)] if '$ref' in schema else []
+        parts.extend((part, base) for part in schema.get('allOf', []))
+        rest = {
+            key: subschema for key, subschema in schema.items()
+            if key not in ('$ref', 'allOf', '$defs')
+        }
+        values = [self.value(part, part_base, depth, hint)
+                  for part, part_base in parts]
+        if any(key in rest for key in ('type', 'properties', 'oneOf')):
+            values.append(self.value(rest, base, depth, hint))
+        if all(isinstance(value, dict) for value in values):
+            return {key: item for value in values for key, item in value.items()}
+
+        return values[-1]
+
+    def _typed(self, schema, base, depth, hint):
+        kind = schema.get('type', 'object')
+        if isinstance(kind, list):
+            kind = kind[0]
+        if kind == 'object':
+            return self._object(schema, base, depth, hint)
+        if kind == 'array':
+            return self._array(schema, base, depth, hint)
+        if kind == 'string':
+            return self._string(schema, hint)
+        if kind in ('number', 'integer'):
+            return self._number(schema, hint)
+        if kind == 'boolean':
+            return self.random.random() < 0.5
+
+        return None
+
+    def value(self, schema, base, depth=0, hint='item'):
+        """
+        Generate a value that conforms to the `schema`, which has the base URI
+        `base`. The `depth` is the number of collections that contain the
+        value, and the `hint` is used to name generated identifiers.
+        """
+
+        if schema is True or schema == {}:
+            return self.name(hint)
+        if '$ref' in schema or 'allOf' in schema:
+            return self._combined(schema, base, depth, hint)
+        if 'const' in schema:
+            return schema['const']
+        if 'enum' in schema:
+            return self.random.choice(schema['enum'])
+        if 'oneOf' in schema or 'anyOf' in schema:
+            return self._alternative(schema, base, depth, hint)
+
+        return self._typed(schema, base, depth, hint)
+
+    def _alternative(self, schema, base, depth, hint):
+        # Combine an alternative with the other keywords, preferring the first
+        # alternative. A value for a oneOf must not be valid under the other
+        # alternatives, otherwise it is generated again or for another one.
+        keyword = 'oneOf' if 'oneOf' in schema else 'anyOf'
+        alternatives = schema[keyword]
+        value = None
+        for _ in range(self.TRIES):
+            for index, alternative in enumerate(alternatives):
+                branch = dict(alternative)
+                for key, subschema in schema.items():
+                    if key != keyword:
+                        branch.setdefault(key, subschema)
+                value = self.value(branch, base, depth, hint)
+                if keyword == 'anyOf' or not any(
+                    self._schemas.is_valid(value, other, base)
+                    for other_index, other in enumerate(alternatives)
+                    if other_index != index
+                ):
+                    return value
+
+        return value
+
+    def generate(self, reference, seed):
+        """
+        Generate data for a schema reference relative to the schema directory,
+        using a fixed seed.
+        """
+
+        self.random.seed(seed)
+        self._names.clear()
+        schema, base = self.resolve(self._schemas.uri(reference), '')
+        return self.value(schema, base)
+
+# Files in the data directory of a visualization with sample projects, in the
+# order in which they are looked for.
+PROJECT_FILES = ('projects_meta.json', 'projects.json', 'data.json')
+
+def sample_projects(path):
+    """
+    Read the names of the projects from sample project metadata, a sample
+    project list or an object with such a list in a `projects` property.
+    Returns an empty list if the file does not exist.
+    """
+
+    try:
+        with open(path, 'r', encoding='utf-8') as projects_file:
+            projects = json.load(projects_file)
+    except FileNotFoundError:
+        return []
+
+    if isinstance(projects, dict):
+        projects = projects.get('projects', [])
+
+    return [
+        project['name'] if isinstance(project, dict) else project
+        for project in projects
+    ]
+
+def name_projects(data, reference, projects):
+    """
+    Replace the names in generated project metadata or a project list with
+    the names of the generated project directories.
+    """
+
+    if reference == 'metadata/projects_meta.json':
+        for project, name in zip(data, projects):
+            project['name'] = name
+    elif reference == 'metadata/projects.json':
+        return list(projects)
+    elif reference == 'timeline/data.json':
+        data['projects'] = list(projects)
+
+    return data
+
+def generate_file(generator, path, reference, seed, projects=()):
+    """
+    Write a data file for a schema reference. The data is generated using
+    a seed that is derived from the `seed` string, such that each file has the
+    same data regardless of which other files are generated. Project metadata
+    and lists are given the names of the `projects`.
+    """
+
+    digest = hashlib.sha256(seed.encode('utf-8')).hexdigest()
+    data = generator.generate(reference, int(digest[:16], 16))
+    if projects:
+        data = name_projects(data, reference, projects)
+    with open(path, 'w', encoding='utf-8') as data_file:
+        json.dump(data, data_file, separators=(',', ':'))
+
+class Visualization: # pylint: disable=too-few-public-methods
+    """
+    Layout of the sample data of a visualization, with a directory for each
+    project that is replicated for the generated projects.
+    """
+
+    def __init__(self, sample, name, scale):
+        self.name = name
+        samples = []
+        for filename in PROJECT_FILES:
+            samples = sample_projects(sample / name / 'data' / filename)
+            if samples:
+                break
+
+        # The sample project with the most files in project directories or
+        # with the project as first part of their name is the template for the
+        # generated projects
+        counts = defaultdict(int)
+        for path in (sample / name).rglob('*'):
+            for part in self._project_parts(path.relative_to(sample)):
+                if part in samples:
+                    counts[part] += 1
+        self._samples = set(samples)
+        self._template = max(counts, key=counts.get) if counts else None
+        if not samples:
+            self.projects = []
+        else:
+            base = self._template or samples[0]
+            prefix = base.rstrip(string.digits) or base
+            self.projects = [f'{prefix}{index}'
+                             for index in range(1, scale + 1)]
+
+    @staticmethod
+    def _project_parts(relative):
+        parts = list(relative.parts[1:-1])
+        parts.append(relative.name.split('.', 1)[0])
+        return parts
+
+    def targets(self, relative):
+        """
+        Determine the paths to write for a file from the sample data, relative
+        to the sample directory. Files in the directory of the template project
+        or named after it are written for each generated project, and files of
+        other sample projects are left out.
+        """
+
+        parts = relative.parts
+        for index, part in enumerate(self._project_parts(relative), start=1):
+            if part == self._template:
+                if index == len(parts) - 1:
+                    name = relative.name[len(part):]
+                    return [relative.with_name(f'{project}{name}')
+                            for project in self.projects]
+                return [
+                    Path(*parts[:index], project, *parts[index + 1:])
+                    for project in self.projects
+                ]
+            if part in self._samples:
+                return []
+
+        return [relative]
+
+class SampleLayout:
+    """
+    Writer of generated data files that follow the layout of the sample data.
+    """
+
+    def __init__(self, args, schemas):
+        self._args = args
+        self._sample = Path(args.sample)
+        self._output = Path(args.output)
+        # Collections in files of projects have their own scale
+        self._generators = (
+            SchemaData(schemas, scale=args.scale, levels=args.levels,
+                       width=args.width),
+            SchemaData(schemas, scale=args.sprints, levels=args.levels,
+                       width=args.width)
+        )
+        with open(args.samples, 'r', encoding='utf-8') as samples_file:
+            samples = json.load(samples_file)
+
+        self._references = {}
+        for pattern, reference in samples.items():
+            for path in self._sample.glob(pattern):
+                self._references[path.relative_to(self._sample)] = reference
+
+        self._visualizations = {}
+        self.data_files = []
+
+    def _visualization(self, name):
+        if name not in self._visualizations:
+            self._visualizations[name] = Visualization(self._sample, name,
+                                                       self._args.scale)
+
+        return self._visualizations[name]
+
+    def write(self, path):
+        """
+        Generate or copy the data for a file from the sample data.
+        """
+
+        relative = path.relative_to(self._sample)
+        visualization = self._visualization(relative.parts[0])
+        targets = visualization.targets(relative)
+        if visualization.name == 'sprint-report' and (
+            targets != [relative] or
+            relative.name in ('projects_meta.json', 'sprints.json')
+        ):
+            # Projects of the sprint report are generated separately
+            return
+
+        generator = self._generators[targets != [relative]]
+        for target in targets:
+            (self._output / target).parent.mkdir(parents=True, exist_ok=True)
+            if relative in self._references:
+                generate_file(generator, self._output / target,
+                              self._references[relative],
+                              f'{self._args.seed}:{target.as_posix()}',
+                              visualization.projects)
+                self.data_files.append((str(self._output / target),
+                                        self._references[relative]))
+            else:
+                shutil.copyfile(path, self._output / target)
+
+    def write_sprint_report(self):
+        """
+        Generate the projects of the sprint report, if it is part of the
+        sample data that was written.
+        """
+
+        if 'sprint-report' not in self._visualizations:
+            return
+
+        data = self._output / 'sprint-report' / 'data'
+        write_projects(data, self._sample / 'sprint-report' / 'data',
+                       self._args.scale, self._args.sprints, self._args.seed)
+        self.data_files.extend(sprint_report_files(data))
+
+def main():
+    """
+    Main entry point.
+    """
+
+    args = parse_args()
+    try:
+        validate_data = import_validate_data()
+    except ImportError as error:
+        print(f'The jsonschema package is required: {error}', file=sys.stderr)
+        return 1
+
+    layout = SampleLayout(args, validate_data.Schemas(args.schema))
+    for path in sorted(Path(args.sample).rglob('*')):
+        relative = path.relative_to(args.sample)
+        if path.is_file() and (not args.visualization or
+                               relative.parts[0] in args.visualization):
+            layout.write(path)
+    layout.write_sprint_report()
+
+    print(f'Generated {len(layout.data_files)} data files at scale '
+          f'{args.scale} in {args.output}')
+    if args.validate:
+        failed, _ = validate_data.check_files(args.schema, layout.data_files,
+                                              args.jobs)
+        if failed:
+            return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Compare load test results of the proxy variants side by side.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from argparse import ArgumentParser
+import html
+import json
+import os
+from pathlib import Path
+import sys
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+
+    parser = ArgumentParser(description='Create load test comparison report')
+    parser.add_argument('--results', default='test/load/results',
+                        help='Directory with results of the current run')
+    parser.add_argument('--output', default='test/load',
+                        help='Directory to write the comparison report to')
+    parser.add_argument('--history', default=os.getenv(
+        'VISUALIZATION_LOAD_HISTORY',
+        str(Path.home() / '.cache' / 'visualization-site' / 'load.json')
+    ), help='JSON file with the latest results of each proxy variant')
+    return parser.parse_args()
+
+def format_value(value):
+    """
+    Format a count, throughput or latency value.
+    """
+
+    if value is None:
+        return 'n/a'
+    if isinstance(value, int):
+        return str(value)
+
+    return f'{value:.1f}'
+
+def write_report(variants, output):
+    """
+    Write an HTML table with the throughput and latency percentiles of each
+    class of requests for the proxy variants next to each other.
+    """
+
+    names = sorted(variants)
+    kinds = []
+    for variant in names:
+        kinds.extend(kind for kind in variants[variant]['classes']
+                     if kind not in kinds)
+
+    with open(Path(output) / 'index.html', 'w', encoding='utf-8') as report:
+        report.write('<!doctype html>\n<html>\n<head>\n')
+        report.write('<meta charset="utf-8">\n')
+        report.write('<title>Proxy load test</title>\n')
+        report.write('<style>table,th,td { border: .1rem solid #aaa; '
+                     'border-collapse: collapse }</style>\n')
+        report.write('</head>\n<body>\n<h1>Proxy load test</h1>\n')
+        report.write('<p>Throughput in requests per second and latency '
+                     'percentiles in milliseconds of each class of requests, '
+                     'for the latest run of each proxy variant.</p>\n')
+        report.write('<table>\n<tr><th>Class</th><th>Metric</th>')
+        for variant in names:
+            run = variants[variant]
+            label = html.escape(f"{variant} ({run['build'] or run['finished']}, "
+                                f"{run['concurrency']} connections)")
+            report.write(f'<th>{label}</th>')
+        report.write('</tr>\n')
+
+        for kind in kinds:
+            metrics = [('requests', None), ('throughput', None),
+                       ('errors', None)]
+            metrics.extend(
+                ('latency', percentile) for percentile in
+                next(run['classes'][kind]['latency'] for run in variants.values()
+                     if kind in run['classes'])
+            )
+            for metric, percentile in metrics:
+                label = percentile if percentile is not None else metric
+                report.write(f'<tr><td>{html.escape(kind)}</td>'
+                             f'<td>{label}</td>')
+                for variant in names:
+                    result = variants[variant]['classes'].get(kind, {})
+                    value = result.get(metric)
+                    if percentile is not None and value is not None:
+                        value = value.get(percentile)
+                    report.write(f'<td>{format_value(value)}</td>')
+                report.write('</tr>\n')
+
+        report.write('</table>\n</body>\n</html>')
+
+def main():
+    """
+    Main entry point.
+    """
+
+    args = parse_args()
+    try:
+        with open(args.history, 'r', encoding='utf-8') as history_file:
+            variants = json.load(history_file)
+    except FileNotFoundError:
+        variants = {}
+
+    paths = sorted(Path(args.results).glob('*.json'))
+    if not paths:
+        print(f'No load test results found in {args.results}', file=sys.stderr)
+        return 1
+
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as result_file:
+            result = json.load(result_file)
+        result['build'] = os.getenv('BUILD_NUMBER', '')
+        variants[result['variant']] = result
+
+    Path(args.history).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.history, 'w', encoding='utf-8') as history_file:
+        json.dump(variants, history_file)
+
+    with open(Path(args.output) / 'comparison.json', 'w',
+              encoding='utf-8') as comparison_file:
+        json.dump(variants, comparison_file, indent=4)
+    write_report(variants, args.output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,220 @@
+"""
+Load test of the visualization hub proxy with a mix of requests.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from argparse import ArgumentParser
+import asyncio
+from collections import Counter
+from datetime import datetime
+import json
+from pathlib import Path
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+from suite.base import get_url
+from suite.load import REQUEST_ERRORS, Connection, summarize
+
+# Relative weights of the classes of requests in the mix.
+WEIGHTS = {
+    'hub': 30,
+    'data': 50,
+    'download': 10,
+    'encrypt': 5,
+    'access': 5
+}
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+
+    parser = ArgumentParser(description='Load test the visualization proxy')
+    parser.add_argument('--duration', type=float, default=30,
+                        help='Number of seconds to send requests for')
+    parser.add_argument('--concurrency', type=int, default=10,
+                        help='Number of concurrent connections')
+    parser.add_argument('--weight', action='append', default=[],
+                        metavar='CLASS=WEIGHT',
+                        help='Override the weight of a class of requests')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for the random selection of requests')
+    parser.add_argument('--timeout', type=float, default=10,
+                        help='Timeout in seconds of each request')
+    parser.add_argument('--variant', default=None,
+                        help='Name of the proxy under test, by default '
+                        'nginx or httpd based on the configuration')
+    parser.add_argument('--config', default='/config.json',
+                        help='Configuration file of the visualization hub')
+    parser.add_argument('--names', default='/visualization_names.txt',
+                        help='File with the names of the visualizations')
+    parser.add_argument('--sample', default='/sample',
+                        help='Sample data directory of the visualizations')
+    parser.add_argument('--output', default='load/results',
+                        help='Directory to write the results to')
+    return parser.parse_args()
+
+def build_mix(config, names, sample):
+    """
+    Create the requests of each class in the mix, as tuples of the method,
+    URL and request body.
+    """
+
+    url = get_url(config, 'visualization')
+    mix = {
+        'hub': [('GET', url, None)] + [
+            ('GET', f'{url}{name}/', None) for name in names
+        ],
+        'data': [
+            ('GET', f'{url}{name}/data/{path.relative_to(data).as_posix()}',
+             None)
+            for name in names
+            for data in [Path(sample) / name / 'data']
+            for path in sorted(data.glob('**/*.json'))
+        ],
+        'download': [('GET', f'{url}{name}.zip', None) for name in names]
+    }
+    if config.get('control_host'):
+        mix['encrypt'] = [('POST', f'{url}encrypt', b'value=load-test')]
+        mix['access'] = [('GET', f'{url}access', None)]
+
+    return {kind: requests for kind, requests in mix.items() if requests}
+
+class LoadTest:
+    """
+    Closed-loop load test with concurrent connections that each perform
+    requests selected from the mix until the duration has passed.
+    """
+
+    def __init__(self, mix, weights, seed=0):
+        self._mix = mix
+        self._kinds = list(mix)
+        self._weights = [weights.get(kind, 0) for kind in self._kinds]
+        self._random = random.Random(seed)
+        self._results = {
+            kind: {'latencies': [], 'status': Counter(), 'bytes': 0}
+            for kind in self._kinds
+        }
+
+    async def _worker(self, address, deadline, timeout):
+        connection = Connection(*address)
+        loop = asyncio.get_running_loop()
+        while loop.time() < deadline:
+            kind = self._random.choices(self._kinds, self._weights)[0]
+            method, url, body = self._random.choice(self._mix[kind])
+            result = self._results[kind]
+            start = time.perf_counter()
+            try:
+                status, size = await asyncio.wait_for(
+                    connection.request(method, url, body), timeout
+                )
+            except REQUEST_ERRORS:
+                await connection.close()
+                result['status']['error'] += 1
+                continue
+
+            result['latencies'].append(time.perf_counter() - start)
+            result['status'][str(status)] += 1
+            result['bytes'] += size
+
+        await connection.close()
+
+    async def run(self, address, duration, concurrency, timeout):
+        """
+        Perform the load test against the proxy at the `address`, a tuple of
+        host name and port. Returns the elapsed time in seconds.
+        """
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(*(
+            self._worker(address, start + duration, timeout)
+            for _ in range(concurrency)
+        ))
+        return loop.time() - start
+
+    def summary(self, elapsed):
+        """
+        Determine throughput, latency percentiles in milliseconds and status
+        counts of each class of requests and of all requests combined.
+        """
+
+        results = dict(self._results)
+        results['total'] = {
+            'latencies': [
+                latency for result in self._results.values()
+                for latency in result['latencies']
+            ],
+            'status': sum((result['status'] for result in self._results.values()),
+                          Counter()),
+            'bytes': sum(result['bytes'] for result in self._results.values())
+        }
+
+        return {
+            kind: summarize(result, elapsed) for kind, result in results.items()
+        }
+
+def main():
+    """
+    Main entry point.
+    """
+
+    args = parse_args()
+    with open(args.config, 'r', encoding='utf-8') as config_file:
+        config = json.load(config_file)
+    with open(args.names, 'r', encoding='utf-8') as names_file:
+        names = names_file.read().split()
+
+    weights = WEIGHTS.copy()
+    weights.update(
+        (kind, float(value)) for kind, value in
+        (weight.split('=', 1) for weight in args.weight)
+    )
+
+    mix = build_mix(config, names, args.sample)
+    variant = args.variant
+    if variant is None:
+        variant = 'nginx' if config.get('proxy_nginx') else 'httpd'
+
+    load_test = LoadTest(mix, weights, args.seed)
+    url = urlsplit(get_url(config, 'visualization'))
+    elapsed = asyncio.run(load_test.run((url.hostname, url.port or 80),
+                                        args.duration, args.concurrency,
+                                        args.timeout))
+    summary = load_test.summary(elapsed)
+
+    Path(args.output).mkdir(parents=True, exist_ok=True)
+    with open(Path(args.output) / f'{variant}.json', 'w',
+              encoding='utf-8') as result_file:
+        json.dump({
+            'variant': variant,
+            'duration': elapsed,
+            'concurrency': args.concurrency,
+            'weights': {kind: weights.get(kind, 0) for kind in mix},
+            'finished': datetime.now().astimezone().isoformat(),
+            'classes': summary
+        }, result_file, indent=4)
+
+    total = summary['total']
+    print(f"{variant}: {total['requests']} requests, "
+          f"{total['throughput']:.1f} requests/s, {total['errors']} errors")
+    return 0 if total['requests'] > total['errors'] else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+"""
+Replay recorded traffic from proxy access logs against the test proxy.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from argparse import ArgumentParser
+import asyncio
+from collections import Counter
+from datetime import datetime
+import gzip
+import json
+from pathlib import Path
+import re
+import sys
+import time
+from urllib.parse import urlsplit
+from suite.base import get_url
+from suite.load import REQUEST_ERRORS, PERCENTILES, Connection, summarize
+
+# Pattern of a line in the `main` log format of the nginx and httpd proxies,
+# which is the combined log format with the X-Forwarded-For header appended.
+LOG_PATTERN = re.compile(
+    r'^(?P<remote_addr>\S+) \S+ (?P<remote_user>\S+) \[(?P<time>[^\]]+)\] '
+    r'"(?P<request>[^"]*)" (?P<status>\d{3}) (?P<bytes>\S+)'
+    r'(?: "(?P<referer>[^"]*)" "(?P<user_agent>[^"]*)")?'
+    r'(?: "(?P<forwarded>[^"]*)")?'
+)
+
+# Format of the local time of a request in the logs.
+TIME_FORMAT = '%d/%b/%Y:%H:%M:%S %z'
+
+# Request methods that are replayed. Other requests are skipped, since their
+# bodies are not logged.
+METHODS = ('GET', 'HEAD')
+
+# Pattern of the rotation number of a log file.
+ROTATION_PATTERN = re.compile(r'\.(\d+)(?:\.gz)?$')
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+
+    parser = ArgumentParser(description='Replay access logs against the proxy')
+    parser.add_argument('logs', nargs='+',
+                        help='Log files or directories with access.log* files')
+    parser.add_argument('--rate', type=float, default=1,
+                        help='Speedup of the replay compared to the recorded '
+                        'times, or 0 to replay as fast as possible')
+    parser.add_argument('--concurrency', type=int, default=20,
+                        help='Maximum number of concurrent connections')
+    parser.add_argument('--timeout', type=float, default=10,
+                        help='Timeout in seconds of each request')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='Maximum number of requests to replay')
+    parser.add_argument('--top', type=int, default=25,
+                        help='Number of paths to include in the results')
+    parser.add_argument('--config', default='/config.json',
+                        help='Configuration file of the visualization hub')
+    parser.add_argument('--output', default='replay/results.json',
+                        help='File to write the results to')
+    return parser.parse_args()
+
+def sort_logs(paths):
+    """
+    Find the log files in the paths and sort them from the oldest rotated log
+    to the current log.
+    """
+
+    files = []
+    for path in (Path(path) for path in paths):
+        if path.is_dir():
+            files.extend(path.glob('access*.log*'))
+        else:
+            files.append(path)
+
+    def rotation(path):
+        match = ROTATION_PATTERN.search(path.name)
+        return (-int(match.group(1)) if match else 0, path.name)
+
+    return sorted(files, key=rotation)
+
+def read_entries(paths):
+    """
+    Stream the parsed log lines from the log files, decompressing them if
+    they are compressed with gzip. Lines that do not match the log format are
+    yielded as `None`.
+    """
+
+    for path in paths:
+        if path.suffix == '.gz':
+            log_file = gzip.open(path, 'rt', encoding='utf-8', errors='replace')
+        else:
+            log_file = open(path, 'r', encoding='utf-8', errors='replace')
+
+        with log_file:
+            for line in log_file:
+                match = LOG_PATTERN.match(line)
+                if not match:
+                    yield None
+                    continue
+
+                entry = match.groupdict()
+                entry['time'] = datetime.strptime(entry['time'], TIME_FORMAT)
+                yield entry
+
+class Sites: # pylint: disable=too-few-public-methods
+    """
+    Sites of the visualization hub in the test environment, which share one
+    host in production and are told apart by the path prefixes of their URLs.
+    """
+
+    def __init__(self, config):
+        self._sites = []
+        for key in ('visualization', 'prediction', 'blog', 'discussion'):
+            if f'{key}_server' not in config or f'{key}_url' not in config:
+                continue
+
+            parts = urlsplit(get_url(config, key))
+            self._sites.append((parts.path, key, parts.netloc))
+
+        # Match the longest prefix first
+        self._sites.sort(key=lambda site: len(site[0]), reverse=True)
+
+    def url(self, target):
+        """
+        Determine the site and test URL of a request target from the logs.
+        """
+
+        parts = urlsplit(target)
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        for prefix, key, netloc in self._sites:
+            if parts.path.startswith(prefix) or parts.path == prefix[:-1]:
+                return key, f'http://{netloc}{path}'
+
+        _, key, netloc = self._sites[-1]
+        return key, f'http://{netloc}{path}'
+
+class Replay:
+    """
+    Replay of requests from the logs at their recorded pace, with a pool of
+    persistent connections per site.
+    """
+
+    def __init__(self, sites, concurrency, timeout):
+        self._sites = sites
+        self._concurrency = concurrency
+        self._timeout = timeout
+        self._pools = {}
+        self._semaphore = None
+        self._stats = {'sites': {}, 'paths': {}}
+        self.counts = Counter()
+
+    def _pool(self, url):
+        parts = urlsplit(url)
+        if parts.netloc not in self._pools:
+            pool = asyncio.LifoQueue()
+            for _ in range(self._concurrency):
+                pool.put_nowait(Connection(parts.hostname, parts.port or 80))
+            self._pools[parts.netloc] = pool
+
+        return self._pools[parts.netloc]
+
+    async def _request(self, site, url, method, lag):
+        pool = self._pool(url)
+        connection = await pool.get()
+        result = self._stats['sites'].setdefault(site, {
+            'latencies': [], 'lag': [], 'status': Counter(), 'bytes': 0
+        })
+        path = self._stats['paths'].setdefault(urlsplit(url).path, {
+            'site': site, 'requests': 0, 'time': 0.0, 'max': 0.0, 'bytes': 0,
+            'status': Counter()
+        })
+        start = time.perf_counter()
+        try:
+            status, size = await asyncio.wait_for(
+                connection.request(method, url), self._timeout
+            )
+        except REQUEST_ERRORS:
+            await connection.close()
+            status = 'error'
+            size = 0
+        finally:
+            pool.put_nowait(connection)
+            self._semaphore.release()
+
+        latency = time.perf_counter() - start
+        result['status'][str(status)] += 1
+        path['status'][str(status)] += 1
+        path['requests'] += 1
+        if status != 'error':
+            result['latencies'].append(latency)
+            result['bytes'] += size
+            path['time'] += latency
+            path['max'] = max(path['max'], latency)
+            path['bytes'] += size
+        result['lag'].append(lag)
+
+    async def run(self, entries, rate, limit=None):
+        """
+        Replay the requests of the log entries. The time between requests is
+        the recorded time divided by the `rate`, or no time at all if the
+        rate is zero. Returns the elapsed time in seconds.
+        """
+
+        loop = asyncio.get_running_loop()
+        self._semaphore = asyncio.Semaphore(self._concurrency * 2)
+        tasks = set()
+        start = loop.time()
+        first = None
+        for entry in entries:
+            if entry is None:
+                self.counts['malformed'] += 1
+                continue
+
+            request = entry['request'].split(' ')
+            if len(request) != 3 or request[0] not in METHODS:
+                self.counts['skipped'] += 1
+                continue
+
+            if first is None:
+                first = entry['time']
+            due = start
+            if rate > 0:
+                due += (entry['time'] - first).total_seconds() / rate
+                await asyncio.sleep(max(0, due - loop.time()))
+
+            # Limit the number of pending requests so that the logs are only
+            # read as fast as the proxy responds.
+            await self._semaphore.acquire()
+            site, url = self._sites.url(request[1])
+            task = asyncio.ensure_future(
+                self._request(site, url, request[0], loop.time() - due)
+            )
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            self.counts['replayed'] += 1
+            if limit is not None and self.counts['replayed'] >= limit:
+                break
+
+        await asyncio.gather(*tasks)
+        for pool in self._pools.values():
+            while not pool.empty():
+                await pool.get_nowait().close()
+
+        return loop.time() - start
+
+    def summary(self, elapsed, top):
+        """
+        Determine throughput, latency and lag percentiles per site and the
+        paths that took the most time to serve in total.
+        """
+
+        sites = {}
+        for site, result in self._stats['sites'].items():
+            sites[site] = summarize(result, elapsed)
+            lag = sorted(result['lag'])
+            sites[site]['lag'] = {
+                f'p{percentile}': lag[
+                    min(len(lag) - 1, int(len(lag) * percentile / 100))
+                ] * 1000 for percentile in PERCENTILES
+            }
+
+        paths = sorted(self._stats['paths'].items(),
+                       key=lambda path: path[1]['time'], reverse=True)[:top]
+        return {
+            'sites': sites,
+            'paths': [
+                {
+                    'path': path,
+                    'site': stats['site'],
+                    'requests': stats['requests'],
+                    'bytes': stats['bytes'],
+                    'total_time': stats['time'] * 1000,
+                    'max_latency': stats['max'] * 1000,
+                    'status': dict(stats['status'])
+                }
+                for path, stats in paths
+            ]
+        }
+
+def main():
+    """
+    Main entry point.
+    """
+
+    args = parse_args()
+    with open(args.config, 'r', encoding='utf-8') as config_file:
+        config = json.load(config_file)
+
+    paths = sort_logs(args.logs)
+    if not paths:
+        print('No access logs found', file=sys.stderr)
+        return 1
+
+    replay = Replay(Sites(config), args.concurrency, args.timeout)
+    elapsed = asyncio.run(replay.run(read_entries(paths), args.rate,
+                                     args.limit))
+    summary = replay.summary(elapsed, args.top)
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as result_file:
+        json.dump({
+            'logs': [str(path) for path in paths],
+            'rate': args.rate,
+            'duration': elapsed,
+            'counts': dict(replay.counts),
+            'finished': datetime.now().astimezone().isoformat(),
+            **summary
+        }, result_file, indent=4)
+
+    print(f"Replayed {replay.counts['replayed']} requests in {elapsed:.1f}s, "
+          f"skipped {replay.counts['skipped']} and {replay.counts['malformed']} "
+          "malformed lines")
+    for path in summary['paths']:
+        print(f"{path['total_time']:10.0f} ms {path['requests']:8} requests "
+              f"{path['path']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
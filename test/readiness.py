@@ -0,0 +1,217 @@
+"""
+Wait for the builds of the visualizations under test to be done.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from argparse import ArgumentParser
+from contextlib import contextmanager
+from datetime import datetime, timezone
+import json
+import os
+from queue import Empty, Queue
+import re
+import subprocess
+import sys
+from threading import Thread
+import time
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+
+    parser = ArgumentParser(description='Wait for visualization builds')
+    parser.add_argument('containers', nargs='+', metavar='NAME=CONTAINER',
+                        help='Visualization name and build container ID')
+    parser.add_argument('--timeout', type=int, default=60,
+                        help='Total seconds to wait for all builds')
+    parser.add_argument('--output', default=None,
+                        help='JSON file to write build timings to')
+    return parser.parse_args()
+
+def parse_time(value):
+    """
+    Parse a timestamp from the Docker engine. Returns `None` if the timestamp
+    is not set.
+    """
+
+    match = re.match(r'(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d+))?', value)
+    if not match or match.group(1).startswith('0001-'):
+        return None
+
+    moment = datetime.strptime(match.group(1), '%Y-%m-%dT%H:%M:%S')
+    fraction = float(f'0.{match.group(2)}') if match.group(2) else 0.0
+    return moment.replace(tzinfo=timezone.utc).timestamp() + fraction
+
+class Builds:
+    """
+    Tracker of the state of visualization build containers.
+    """
+
+    INSPECT_FORMAT = '{{.Id}} {{.State.Running}} {{.State.ExitCode}} ' + \
+        '{{.State.StartedAt}} {{.State.FinishedAt}}'
+
+    def __init__(self, containers):
+        self._names = {}
+        for container in containers:
+            name, container_id = container.split('=', 1)
+            self._names[container_id] = name
+        self._pending = set(self._names.values())
+        self._timings = {}
+
+    @property
+    def pending(self):
+        """
+        Names of visualizations that are still being built.
+        """
+
+        return self._pending
+
+    def _find(self, container_id):
+        for known_id, name in self._names.items():
+            if container_id.startswith(known_id) or \
+                known_id.startswith(container_id):
+                return name
+
+        return None
+
+    @contextmanager
+    def watch(self):
+        """
+        Watch for build containers to stop within the context. Provides a queue
+        that is filled with the IDs of stopped containers. Events since the
+        watch started are replayed, since the stream may only subscribe to
+        the Docker engine after some containers already stopped.
+        """
+
+        args = [
+            'docker', 'events', '--format', '{{.ID}}',
+            '--since', str(int(time.time())),
+            '--filter', 'type=container', '--filter', 'event=die'
+        ]
+        for container_id in self._names:
+            args.extend(['--filter', f'container={container_id}'])
+
+        with subprocess.Popen(args, stdout=subprocess.PIPE,
+                              universal_newlines=True) as process:
+            stopped = Queue()
+
+            def read():
+                for line in process.stdout:
+                    stopped.put(line.strip())
+
+            reader = Thread(target=read, daemon=True)
+            reader.start()
+            try:
+                yield stopped
+            finally:
+                process.terminate()
+                process.wait()
+                reader.join()
+
+    def inspect(self, container_ids=None):
+        """
+        Check the state of the build containers, or the containers from
+        `container_ids` only, and update the visualizations that are done.
+        """
+
+        if container_ids is None:
+            container_ids = list(self._names)
+
+        output = subprocess.check_output(
+            ['docker', 'inspect', '--format', self.INSPECT_FORMAT] +
+            list(container_ids), universal_newlines=True
+        )
+        for line in output.splitlines():
+            container_id, running, exit_code, started, finished = line.split()
+            name = self._find(container_id)
+            if name is None or running == 'true' or name not in self._pending:
+                continue
+
+            self._pending.discard(name)
+            start = parse_time(started)
+            end = parse_time(finished)
+            duration = end - start if start is not None and end is not None \
+                else None
+            self._timings[name] = {
+                'exit_code': int(exit_code),
+                'started': started,
+                'finished': finished,
+                'duration': duration
+            }
+            seconds = f'{duration:.1f}s' if duration is not None else 'unknown'
+            print(f'{name} is done (build time {seconds}, '
+                  f'exit code {exit_code})', flush=True)
+
+    def write(self, filename):
+        """
+        Write the timings of the builds that are done to a JSON file.
+
+        The file is replaced atomically, such that tests which wait for their
+        visualization to be built never read a partially written file.
+        """
+
+        with open(f'{filename}.tmp', 'w', encoding='utf-8') as timings_file:
+            json.dump(self._timings, timings_file, indent=4)
+
+        os.replace(f'{filename}.tmp', filename)
+
+def main():
+    """
+    Main entry point.
+    """
+
+    args = parse_args()
+    builds = Builds(args.containers)
+    deadline = time.monotonic() + args.timeout
+
+    # Start listening to events before the initial check, such that no stop
+    # events are missed in between
+    try:
+        with builds.watch() as stopped:
+            builds.inspect()
+            if args.output is not None:
+                builds.write(args.output)
+            while builds.pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                try:
+                    container_id = stopped.get(timeout=remaining)
+                except Empty:
+                    break
+
+                builds.inspect([container_id])
+                if args.output is not None:
+                    builds.write(args.output)
+    except subprocess.CalledProcessError as error:
+        print(f'An error occurred while waiting for builds: {error}',
+              file=sys.stderr)
+        return 1
+
+    if builds.pending:
+        names = ', '.join(sorted(builds.pending))
+        print(f'{names} did not seem to be done after {args.timeout}s.',
+              file=sys.stderr)
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,268 @@
+"""
+Generate synthetic data for the sprint report visualization at a larger scale.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+import importlib
+import json
+import os
+from pathlib import Path
+import random
+import shutil
+import sys
+
+# Format of dates in the project features.
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Length of a generated sprint.
+SPRINT_LENGTH = timedelta(days=14)
+
+# Features that are counts of stories in a sprint.
+STORY_FEATURES = (
+    'num_stories', 'num_not_done', 'num_removed_stories', 'num_added_stories',
+    'num_done_stories'
+)
+
+# Patterns of the generated files with the schemas to validate them with.
+PATTERNS = {
+    'projects_meta.json': 'metadata/projects_meta.json',
+    'sprints.json': 'sprint-report/sprints.json',
+    '*/default.json': 'sprint-report/project_features.json',
+    '*/details.json': 'sprint-report/details.json',
+    '*/num_*.json': 'sprint-report/project_feature.json',
+    '*/sprint_weekdays.json': 'sprint-report/project_feature.json'
+}
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+
+    parser = ArgumentParser(description='Generate sprint report data')
+    parser.add_argument('output', help='Data directory to write to')
+    parser.add_argument('--projects', type=int, default=100,
+                        help='Number of projects to generate')
+    parser.add_argument('--sprints', type=int, default=100,
+                        help='Number of sprints to generate per project')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='Seed for the random number generator')
+    parser.add_argument('--sample', default='test/sample/sprint-report/data',
+                        help='Sample data directory with metadata to reuse')
+    parser.add_argument('--validate', default=None, metavar='SCHEMA_DIR',
+                        help='Validate the data against the schemas in the '
+                        'directory, e.g. schema/, using jsonschema')
+    return parser.parse_args()
+
+class SprintReportData:
+    """
+    Generator of project features and details for the sprint report.
+    """
+
+    def __init__(self, sprints, seed=0):
+        self._sprints = sprints
+        self._random = random.Random(seed)
+        self._start = datetime(2001, 1, 1, 12, 0, 0)
+        self._sprint_id = 0
+        self._issue_id = 0
+
+    def project_meta(self, index):
+        """
+        Generate the metadata of a project.
+        """
+
+        return {
+            'name': f'Proj{index}',
+            'quality_display_name': f'Project{index}',
+            'recent': self._random.random() < 0.8,
+            'core': self._random.random() < 0.9,
+            'team': 1 if self._random.random() < 0.5 else 0,
+            'num_sprints': self._sprints
+        }
+
+    def _stories(self, name, points):
+        # Split the story points into stories with issue keys
+        keys = []
+        story_points = []
+        remaining = points
+        while remaining > 0:
+            size = min(remaining, self._random.choice((0.5, 1, 2, 3, 5, 8)))
+            self._issue_id += 1
+            keys.append(f'{name}-{self._issue_id}')
+            story_points.append(size)
+            remaining -= size
+
+        return keys, story_points
+
+    def project(self, name, board_id):
+        """
+        Generate the default features, the story features and the details of
+        the sprints of a project. Returns a dictionary of the data by the names
+        of the files of the project.
+        """
+
+        self._issue_id = 0
+        default = []
+        features = {feature: [] for feature in STORY_FEATURES}
+        details = {'num_story_points': {}, 'done_story_points': {}}
+        for num in range(1, self._sprints + 1):
+            self._sprint_id += 1
+            start = self._start + (num - 1) * SPRINT_LENGTH
+            keys, story_points = self._stories(name,
+                                               self._random.randint(0, 60))
+            done = [self._random.random() < 0.8 for _ in keys]
+            done_points = sum(points for points, is_done
+                              in zip(story_points, done) if is_done)
+            default.append({
+                'sprint_name': f'Sprint{num}',
+                'sprint_num': num,
+                'sprint_id': self._sprint_id,
+                'board_id': board_id,
+                'start_date': start.strftime(DATE_FORMAT),
+                'close_date': (start + SPRINT_LENGTH).strftime(DATE_FORMAT),
+                'num_story_points': sum(story_points),
+                'done_story_points': done_points,
+                'velocity': round(done_points / 10, 2)
+            })
+
+            removed = self._random.randint(0, 3)
+            added = self._random.randint(0, 3)
+            features['num_stories'].append(len(keys))
+            features['num_not_done'].append(done.count(False))
+            features['num_removed_stories'].append(removed)
+            features['num_added_stories'].append(added)
+            features['num_done_stories'].append(done.count(True))
+
+            sprint_id = str(self._sprint_id)
+            details['num_story_points'][sprint_id] = {
+                'key': keys,
+                'story_points': story_points
+            }
+            details['done_story_points'][sprint_id] = {
+                'key': [key for key, is_done in zip(keys, done) if is_done],
+                'story_points': [points for points, is_done
+                                 in zip(story_points, done) if is_done]
+            }
+
+        features['sprint_weekdays'] = [10] * self._sprints
+        return {'default': default, 'details': details, **features}
+
+def write_json(path, data):
+    """
+    Write compact JSON data to a file.
+    """
+
+    with open(path, 'w', encoding='utf-8') as json_file:
+        json.dump(data, json_file, separators=(',', ':'))
+
+def write_projects(output, sample, num_projects, sprints, seed=0):
+    """
+    Write the sprint and project metadata and a directory for each generated
+    project to the `output` data directory, with files that are not generated
+    copied from the first project in the `sample` data directory.
+    """
+
+    output = Path(output)
+    sample = Path(sample)
+    write_json(output / 'sprints.json', {
+        'limit': sprints,
+        'closed': False,
+        'old': False
+    })
+
+    generator = SprintReportData(sprints, seed)
+    projects = [generator.project_meta(index)
+                for index in range(1, num_projects + 1)]
+    write_json(output / 'projects_meta.json', projects)
+
+    for board_id, project in enumerate(projects, start=1):
+        path = output / project['name']
+        path.mkdir(exist_ok=True)
+        for filename in ('links.json', 'metric_targets.json', 'source_ids.json',
+                         'sources.json'):
+            shutil.copyfile(sample / 'Proj1' / filename, path / filename)
+
+        for name, data in generator.project(project['name'],
+                                            board_id).items():
+            write_json(path / f'{name}.json', data)
+
+def generate(args):
+    """
+    Write a data directory with the metadata from the sample data and the
+    generated projects.
+    """
+
+    output = Path(args.output)
+    sample = Path(args.sample)
+    shutil.rmtree(output, ignore_errors=True)
+    output.mkdir(parents=True)
+    for path in sample.glob('*.json'):
+        shutil.copyfile(path, output / path.name)
+
+    write_projects(output, sample, args.projects, args.sprints, args.seed)
+
+def data_files(output):
+    """
+    Find the generated files in the `output` data directory. Returns a list
+    of tuples of files and schema references.
+    """
+
+    return [
+        (str(path), reference) for pattern, reference in PATTERNS.items()
+        for path in sorted(Path(output).glob(pattern))
+    ]
+
+def import_validate_data():
+    """
+    Import the `validate_data` module from the root of the repository, which
+    requires the `jsonschema` package.
+    """
+
+    root = str(Path(__file__).resolve().parent.parent)
+    if root not in sys.path:
+        sys.path.append(root)
+    return importlib.import_module('validate_data')
+
+def validate(output, schema_dir):
+    """
+    Validate the generated project data against the sprint report schemas.
+    Returns the number of validation errors.
+    """
+
+    validate_data = import_validate_data()
+    _, violations = validate_data.check_files(schema_dir, data_files(output),
+                                              os.cpu_count())
+    return violations
+
+def main():
+    """
+    Main entry point.
+    """
+
+    args = parse_args()
+    generate(args)
+    print(f'Generated {args.projects} projects with {args.sprints} sprints '
+          f'in {args.output}')
+    if args.validate is not None and validate(args.output, args.validate):
+        return 1
+
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+"""
+Accessibility scans of the pages visited by the tests.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import csv
+from hashlib import sha256
+import html
+import json
+from axe_selenium_python import Axe
+
+class Accessibility:
+    """
+    Accessibility scans with axe, which are only performed once for each page
+    state, and the aggregation of their violations into reports.
+    """
+
+    # Script that returns the URL of the current page, a digest of its DOM
+    # and whether axe is already injected in the page.
+    DIGEST_SCRIPT = """
+        const dom = document.documentElement.outerHTML;
+        let h1 = 0xdeadbeef, h2 = 0x41c6ce57;
+        for (let i = 0; i < dom.length; i++) {
+            const code = dom.charCodeAt(i);
+            h1 = Math.imul(h1 ^ code, 2654435761);
+            h2 = Math.imul(h2 ^ code, 1597334677);
+        }
+        h1 = Math.imul(h1 ^ (h1 >>> 16), 2246822507) ^
+            Math.imul(h2 ^ (h2 >>> 13), 3266489909);
+        h2 = Math.imul(h2 ^ (h2 >>> 16), 2246822507) ^
+            Math.imul(h1 ^ (h1 >>> 13), 3266489909);
+        return [
+            window.location.href,
+            `${dom.length}-${(h2 >>> 0).toString(16)}${(h1 >>> 0).toString(16)}`,
+            typeof window.axe !== "undefined"
+        ];
+    """
+
+    # Options for running axe.
+    OPTIONS = {
+        'rules': {
+            # Axe considers all anchor links to be skip links
+            'skip-link': {'enabled': False}
+        }
+    }
+
+    # Columns of the CSV report, with one row per element of a violation.
+    COLUMNS = (
+        'Test', 'URL', 'Rule', 'Impact', 'Criteria', 'Help', 'Element',
+        'Messages'
+    )
+
+    # Order of the impact of violations in the summary.
+    IMPACTS = ('critical', 'serious', 'moderate', 'minor', None)
+
+    def __init__(self, script_url='/axe-core/axe.min.js'):
+        self._script_url = script_url
+        self._scans = {}
+
+    @staticmethod
+    def _compact(violations):
+        return [
+            {
+                'id': violation['id'],
+                'impact': violation.get('impact'),
+                'tags': [
+                    tag for tag in violation.get('tags', [])
+                    if tag.startswith('wcag')
+                ],
+                'help': violation.get('help', ''),
+                'nodes': [
+                    {
+                        'target': ' '.join(str(target)
+                                           for target in node['target']),
+                        'summary': node.get('failureSummary', '')
+                    }
+                    for node in violation.get('nodes', [])
+                ]
+            }
+            for violation in violations
+        ]
+
+    def scan(self, driver):
+        """
+        Check the accessibility of the current page of the `driver`.
+
+        Returns a tuple of the key of the page state, the scan and the full
+        axe results. The scan is a dictionary with the URL, the compact
+        violations and a textual report. The results are `None` if the page
+        state was already scanned before, in which case its scan is reused.
+        """
+
+        url, digest, injected = driver.execute_script(self.DIGEST_SCRIPT)
+        key = sha256(f'{url}\n{digest}'.encode('utf-8')).hexdigest()
+        if key in self._scans:
+            return key, self._scans[key], None
+
+        axe = Axe(driver, script_url=self._script_url)
+        if not injected:
+            axe.inject()
+        results = axe.run(options=json.dumps(self.OPTIONS))
+
+        scan = {
+            'url': url,
+            'violations': self._compact(results['violations']),
+            'report': html.escape(axe.report(results['violations']))
+        }
+        self._scans[key] = scan
+        return key, scan, results
+
+    def add(self, key, scan):
+        """
+        Include a `scan` of a page state with the given `key`, for example
+        from a worker that ran a shard of the tests.
+        """
+
+        self._scans.setdefault(key, scan)
+
+    def get(self, key):
+        """
+        Retrieve the scan of the page state with the given `key`.
+        """
+
+        return self._scans[key]
+
+    def scans(self, keys):
+        """
+        Retrieve a dictionary of the scans of the page states with the given
+        `keys`.
+        """
+
+        return {key: self._scans[key] for key in keys}
+
+    def write_csv(self, filename, tests):
+        """
+        Write the violations of the scans of the `tests`, a sequence of test
+        names and keys of their page states, to a CSV file row by row.
+        """
+
+        with open(filename, 'w', encoding='utf-8', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(self.COLUMNS)
+            for name, key in tests:
+                scan = self._scans[key]
+                for violation in scan['violations']:
+                    for node in violation['nodes']:
+                        writer.writerow([
+                            name, scan['url'], violation['id'],
+                            violation['impact'], ' '.join(violation['tags']),
+                            violation['help'], node['target'], node['summary']
+                        ])
+
+    def summary(self, tests):
+        """
+        Aggregate the violations of the scans of the `tests`, a sequence of
+        test names and keys of their page states, by their rule. Returns
+        a list of dictionaries with the rule, impact, help text, number of
+        tests and number of distinct elements, ordered by impact.
+        """
+
+        rules = {}
+        for name, key in tests:
+            scan = self._scans[key]
+            for violation in scan['violations']:
+                rule = rules.setdefault(violation['id'], {
+                    'id': violation['id'],
+                    'impact': violation['impact'],
+                    'help': violation['help'],
+                    'tests': set(),
+                    'elements': set()
+                })
+                rule['tests'].add(name)
+                rule['elements'].update((scan['url'], node['target'])
+                                        for node in violation['nodes'])
+
+        return [
+            dict(rule, tests=len(rule['tests']),
+                 elements=len(rule['elements']))
+            for rule in sorted(rules.values(), key=lambda rule: (
+                self.IMPACTS.index(rule['impact'])
+                if rule['impact'] in self.IMPACTS else len(self.IMPACTS),
+                rule['id']
+            ))
+        ]
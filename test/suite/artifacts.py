@@ -0,0 +1,83 @@
+"""
+Background handling of test result artifacts.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, wait
+
+class Artifacts:
+    """
+    Executor for tasks that write or upload artifacts of test results, such
+    that they do not hold up the next test.
+    """
+
+    # Number of threads that handle artifacts in the background.
+    WORKERS = 4
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=self.WORKERS,
+                                            thread_name_prefix='artifact')
+        # Tasks that depend on earlier tasks run one by one in order
+        self._ordered = ThreadPoolExecutor(max_workers=1,
+                                           thread_name_prefix='artifact-ordered')
+        self._pending = []
+        self.errors = []
+
+    def submit(self, name, function, *args):
+        """
+        Perform a task for an artifact of the test result with the given
+        `name` in the background. Errors from the task are tracked in the
+        `errors` list.
+        """
+
+        self._track(name, self._executor.submit(function, *args))
+
+    def submit_ordered(self, name, function, *args):
+        """
+        Perform a task for an artifact of the test result with the given
+        `name` in the background, after all earlier ordered tasks are done.
+        Errors from the task are tracked in the `errors` list.
+        """
+
+        self._track(name, self._ordered.submit(function, *args))
+
+    def _track(self, name, future):
+        future.add_done_callback(lambda done: self._check_error(name, done))
+        self._pending.append(future)
+
+    def _check_error(self, name, future):
+        error = future.exception()
+        if error is not None:
+            self.errors.append((name, str(error)))
+
+    def wait(self):
+        """
+        Wait for all the pending tasks to be done.
+        """
+
+        wait(self._pending)
+        self._pending = []
+
+    def close(self):
+        """
+        Wait for all the pending tasks and stop the executor.
+        """
+
+        self.wait()
+        self._executor.shutdown()
+        self._ordered.shutdown()
@@ -18,9 +18,7 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
-from contextlib import closing
 import errno
-import html
 from http.client import BadStatusLine
 import json
 import os
@@ -29,27 +27,54 @@ import linecache
 from socket import error as SocketError
 import time
 import unittest
-from urllib.error import URLError
 from urllib.parse import urljoin
-from urllib.request import Request, urlopen
+from selenium.common.exceptions import WebDriverException
 from selenium.webdriver import Remote
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.remote.remote_connection import RemoteConnection
 from selenium.webdriver.support.wait import WebDriverWait
-from axe_selenium_python import Axe
+from . import pipeline
+from .coverage import Coverage
+from .performance import Budget, Performance
+from .pool import SessionPool
 
 def skip_unless_visualization(name):
     """
     Skip a test unless a visualization with the given `name` is under test,
-    i.e., it is part of the produced output.
+    i.e., it is part of the produced output. Otherwise, the test is marked
+    with the visualization, so that it can wait for its build.
     """
 
     visualization_names = linecache.getline('/visualization_names.txt', 1)
     if name in visualization_names.rstrip().split(' '):
-        return lambda func: func
+        def decorator(func):
+            # Track the visualization for gating the test on its build
+            func.visualization = name
+            return func
+
+        return decorator
 
     return unittest.skip(f"Visualization {name} is not under test")
 
+def get_url(config, key):
+    """
+    Determine the URL of a site of the visualization hub from the configuration
+    and the organization environment variables.
+    """
+
+    org = os.getenv('VISUALIZATION_ORGANIZATION')
+    combined = os.getenv('VISUALIZATION_COMBINED')
+    base = f"http://{config[f'{key}_server']}"
+
+    if combined == "true":
+        url = config[f'{key}_url'].replace('/$organization', '/combined')
+    else:
+        url = re.sub(r'(/)?\$organization',
+                     rf'\1{org}' if org is not None else '',
+                     config[f'{key}_url'])
+
+    return urljoin(base, url)
+
 class IntegrationTest(unittest.TestCase):
     """
     Integration tests that use a remote Selenium driver to connect to the test
@@ -67,6 +92,15 @@ class IntegrationTest(unittest.TestCase):
     WAIT_TIMEOUT = 5
     WAIT_FREQUENCY = 0.5
 
+    # Browser window size for each test.
+    WINDOW_SIZE = (1366, 768)
+
+    # Remote driver sessions shared between all the tests.
+    sessions = SessionPool()
+
+    # Limits on the performance metrics of the tests.
+    budget = Budget()
+
     @staticmethod
     def _setup_driver():
         # Connect to the remote executor. Exceptions may be thrown when the
@@ -92,88 +126,107 @@ class IntegrationTest(unittest.TestCase):
 
             return None
 
-    def _get_url(self, key):
-        org = os.getenv('VISUALIZATION_ORGANIZATION')
-        combined = os.getenv('VISUALIZATION_COMBINED')
-        base = f"http://{self._config[f'{key}_server']}"
-
-        if combined == "true":
-            url = self._config[f'{key}_url'].replace('/$organization',
-                                                     '/combined')
-        else:
-            url = re.sub(r'(/)?\$organization',
-                         rf'\1{org}' if org is not None else '',
-                         self._config[f'{key}_url'])
-
-        return urljoin(base, url)
-
     def setUp(self):
+        if pipeline.is_enabled():
+            visualization = pipeline.get_visualization(self)
+            if visualization is not None and \
+                visualization not in pipeline.read_builds():
+                self.fail(f'Visualization {visualization} was not built')
+
         RemoteConnection.set_timeout(self.CONNECTION_TIMEOUT)
-        self._driver = self._setup_driver()
-        tries = 0
-        while self._driver is None and tries < self.DRIVER_POLL_TIMEOUT:
-            time.sleep(self.DRIVER_POLL_FREQUENCY)
+        self._driver = self.sessions.acquire()
+        if self._driver is None:
             self._driver = self._setup_driver()
-            tries += self.DRIVER_POLL_FREQUENCY
+            tries = 0
+            while self._driver is None and tries < self.DRIVER_POLL_TIMEOUT:
+                time.sleep(self.DRIVER_POLL_FREQUENCY)
+                self._driver = self._setup_driver()
+                tries += self.DRIVER_POLL_FREQUENCY
 
-        if self._driver is None:
-            self.fail('Could not establish Selenium remote driver')
+            if self._driver is None:
+                self.fail('Could not establish Selenium remote driver')
+
+            self.sessions.add(self._driver)
 
-        self._driver.set_window_size(1366, 768)
+        self._driver.set_window_size(*self.WINDOW_SIZE)
+        self._performance = Performance()
 
         with open('/config.json', encoding='utf-8') as config_file:
             self._config = json.load(config_file)
 
-        self._visualization_url = self._get_url('visualization')
-        self._prediction_url = self._get_url('prediction')
+        self._visualization_url = get_url(self._config, 'visualization')
+        self._prediction_url = get_url(self._config, 'prediction')
 
     def _wait_for(self, condition, message=''):
-        return WebDriverWait(self._driver, self.WAIT_TIMEOUT,
-                             self.WAIT_FREQUENCY).until(condition, message)
+        result = WebDriverWait(self._driver, self.WAIT_TIMEOUT,
+                               self.WAIT_FREQUENCY).until(condition, message)
+        self._performance.observe(self._driver)
+        return result
+
+    def _has_failed(self):
+        if self._outcome is None:
+            return True
+
+        if hasattr(self._outcome, 'errors'):
+            # Before Python 3.11, errors are only passed to the result after
+            # the tear down
+            return any(error is not None for _, error in self._outcome.errors)
+
+        result = self._outcome.result
+        return any(getattr(test, 'test_id', None) == self.id()
+                   for test, _ in result.errors + result.failures)
+
+    def _release_driver(self):
+        # Reuse the session unless the test failed, since its browser state
+        # may then not be reliable anymore
+        if self._has_failed():
+            self.sessions.discard(self._driver)
+        else:
+            self.sessions.release(self._driver)
+
+        self._driver = None
 
     def tearDown(self):
-        if self._driver is None or self._outcome is None or \
-            self._outcome.result is None or \
+        if self._driver is None:
+            return
+
+        try:
+            self._report()
+        finally:
+            self._release_driver()
+
+    def _report(self):
+        if self._outcome is None or self._outcome.result is None or \
             getattr(self._outcome.result, 'reporter', None) is None:
-            if self._driver is not None:
-                self._driver.quit()
-                self._driver = None
             return
 
         reporter = self._outcome.result.reporter
-        self._driver.save_screenshot(f'results/{self.id()}.png')
-        reporter.write_result(self.id())
-
+        reporter.write_result(self.id(), self._driver.get_screenshot_as_png())
         reporter.write_log(self.id(), self._driver.get_log('browser'))
 
-        coverage = self._driver.execute_script("return window.__coverage__")
+        coverage_files = reporter.coverage_files()
+        if coverage_files is None:
+            coverage = self._driver.execute_script("return window.__coverage__")
+        else:
+            coverage = self._driver.execute_script(Coverage.DELTA_SCRIPT,
+                                                   coverage_files)
         if coverage is not None:
-            headers = {'Content-Type': 'application/json'}
-            request = Request('http://coverage.test:8888/client',
-                              data=json.dumps(coverage).encode('utf-8'),
-                              headers=headers)
-            try:
-                with closing(urlopen(request)) as response:
-                    status_code = response.getcode()
-                    if status_code != 200:
-                        self.fail('Could not upload coverage data: server '
-                                  f'responsed with status code {status_code}')
-            except URLError as error:
-                self.fail(f'Could not upload coverage data: {error}')
-
-        axe = Axe(self._driver, script_url='/axe-core/axe.min.js')
-        axe.inject()
-        accessibility = axe.run(options=json.dumps({
-            'rules': {
-                # Axe considers all anchor links to be skip links
-                'skip-link': {'enabled': False}
-            }
-        }))
-        axe.write_results(accessibility,
-                          f'accessibility/{self.id()}.json')
-
-        report = html.escape(axe.report(accessibility["violations"]))
-        reporter.write_accessibility(self.id(), report)
-
-        self._driver.quit()
-        self._driver = None
+            reporter.write_coverage(self.id(), coverage)
+
+        # Capture the performance before the accessibility checks load
+        # additional resources in the page
+        try:
+            performance = self._performance.capture(self._driver)
+            reporter.write_performance(self.id(), performance)
+        except WebDriverException as error:
+            print(f'Could not capture performance of {self.id()}: {error}')
+            performance = None
+
+        # Tests that end in the same page state share one accessibility scan
+        reporter.check_accessibility(self.id(), self._driver)
+
+        if performance is not None:
+            violations = self.budget.check(self.id(), performance['metrics'])
+            if violations:
+                self.fail('Performance budget exceeded for '
+                          f"{performance['url']}: {'; '.join(violations)}")
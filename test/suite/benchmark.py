@@ -0,0 +1,179 @@
+"""
+Benchmark of the rendering of the formats of the Sprint Report visualization.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from datetime import datetime
+from functools import partial
+import json
+from pathlib import Path
+from selenium.webdriver.common.action_chains import ActionChains
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions
+from .base import IntegrationTest, skip_unless_visualization
+
+class SprintReportBenchmark(IntegrationTest):
+    """
+    Benchmark of the render and interaction latency of the sprint report
+    formats, using the data that is currently provided to the visualization.
+    """
+
+    # Script that starts tracking the time from the first event of a type to
+    # the moment that a new or previously hidden element matching a selector
+    # is visible.
+    ARM_SCRIPT = """
+        const [selector, type, timeout] = arguments;
+        const visible = (element) => element !== null &&
+            element.getClientRects().length > 0 &&
+            window.getComputedStyle(element).visibility !== 'hidden';
+        const old = document.querySelector(selector);
+        const oldVisible = visible(old);
+        const measurement = {start: null, end: null};
+        window.__benchmark__ = measurement;
+        document.addEventListener(type, (event) => {
+            measurement.start = event.timeStamp;
+        }, {capture: true, once: true});
+        const deadline = performance.now() + timeout;
+        const check = () => {
+            const element = document.querySelector(selector);
+            if (visible(element) && (element !== old || !oldVisible)) {
+                measurement.end = performance.now();
+            }
+            else if (performance.now() < deadline) {
+                window.requestAnimationFrame(check);
+            }
+        };
+        window.requestAnimationFrame(check);
+    """
+
+    # Script that waits for the tracked element to be rendered and provides
+    # the latency in milliseconds, or `null` if it was not rendered in time.
+    MEASURE_SCRIPT = """
+        const [timeout, callback] = arguments;
+        const measurement = window.__benchmark__;
+        const deadline = performance.now() + timeout;
+        const check = () => {
+            if (measurement.start !== null && measurement.end !== null) {
+                callback(measurement.end - measurement.start);
+            }
+            else if (performance.now() < deadline) {
+                window.setTimeout(check, 10);
+            }
+            else {
+                callback(null);
+            }
+        };
+        check();
+    """
+
+    # Formats in the order that they are rendered, with the selector of the
+    # element that is rendered for them and the interaction that is measured:
+    # the selector of the element to interact with, the event type and the
+    # selector of the element that results from the interaction.
+    FORMATS = {
+        'line_chart': ('.chart', ('.chart', 'mousemove', '.focus')),
+        'bar_chart': ('.chart', ('.chart', 'mousemove', '.focus')),
+        'area_chart': ('.chart', ('.chart', 'mousemove', '.focus')),
+        'scatter_plot': ('.chart', ('.chart', 'mousemove', '.focus')),
+        'sankey_chart': ('.chart', ('.chart', 'mousemove', '.focus')),
+        'table': (
+            '#format-content table',
+            ('#format-content table .fa-expand', 'click', 'table.details')
+        )
+    }
+
+    # Timeout in seconds for each render or interaction.
+    BENCHMARK_TIMEOUT = 60
+
+    # Options of the benchmark run, set by the benchmark runner.
+    scale = 'default'
+    repeat = 3
+    selected = 1
+    output = 'benchmark/results'
+
+    def _measure(self, selector, event_type, action):
+        timeout = self.BENCHMARK_TIMEOUT * 1000
+        self._driver.execute_script(self.ARM_SCRIPT, selector, event_type,
+                                    timeout)
+        action()
+        return self._driver.execute_async_script(self.MEASURE_SCRIPT, timeout)
+
+    def _interact(self, target, event_type):
+        element = self._driver.find_element(By.CSS_SELECTOR, target)
+        if event_type == 'click':
+            element.click()
+        else:
+            ActionChains(self._driver).move_to_element(element) \
+                .move_by_offset(1, 1).perform()
+
+    def _run(self, timings):
+        driver = self._driver
+        driver.get(f'{self._visualization_url}/sprint-report')
+        items = self._wait_for(expected_conditions.visibility_of_element_located(
+            (By.ID, 'navigation')
+        ))
+        projects = items.find_elements(By.TAG_NAME, 'li')[-self.selected:]
+
+        # Initial render of the default format after selecting projects
+        timings['initial']['render'].append(self._measure(
+            '#format-content table', 'click', projects[0].click
+        ))
+        for project in projects[1:]:
+            project.click()
+
+        options = driver.find_element(By.ID, 'format')
+        for name, (selector, interaction) in self.FORMATS.items():
+            item = options.find_element(By.ID, f'format-{name}')
+            timings[name]['render'].append(
+                self._measure(selector, 'click', item.click)
+            )
+
+            target, event_type, result = interaction
+            timings[name]['interaction'].append(self._measure(
+                result, event_type, partial(self._interact, target, event_type)
+            ))
+
+    @skip_unless_visualization("sprint-report")
+    def test_formats(self):
+        """
+        Measure the render and interaction latency of the formats.
+        """
+
+        self._driver.set_script_timeout(self.BENCHMARK_TIMEOUT + 5)
+        timings = {
+            name: {'render': [], 'interaction': []}
+            for name in ('initial',) + tuple(self.FORMATS)
+        }
+        for _ in range(self.repeat):
+            self._run(timings)
+
+        Path(self.output).mkdir(parents=True, exist_ok=True)
+        with open(Path(self.output) / f'{self.scale}.json', 'w',
+                  encoding='utf-8') as result_file:
+            json.dump({
+                'scale': self.scale,
+                'selected': self.selected,
+                'repeat': self.repeat,
+                'finished': datetime.now().astimezone().isoformat(),
+                'formats': timings
+            }, result_file, indent=4)
+
+        missing = [
+            name for name in self.FORMATS if None in timings[name]['render']
+        ]
+        self.assertEqual(missing, [], 'Formats were not rendered in time')
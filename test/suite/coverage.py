@@ -0,0 +1,112 @@
+"""
+Local merging of coverage data from the visualizations under test.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+from threading import Lock
+
+class Coverage:
+    """
+    Combined istanbul coverage data built from deltas of the tests.
+    """
+
+    # Script that retrieves the coverage data of the current page. Files that
+    # are already known (argument with paths and hashes) only have the hit
+    # counters that are nonzero, while other files have full coverage data.
+    DELTA_SCRIPT = """
+        const coverage = window.__coverage__;
+        if (typeof coverage === "undefined") {
+            return null;
+        }
+        const known = arguments[0];
+        const hits = (counters) => Object.fromEntries(
+            Object.entries(counters).filter(([, count]) => Array.isArray(count) ?
+                count.some(branch => branch > 0) : count > 0
+            )
+        );
+        return Object.fromEntries(Object.entries(coverage).map(
+            ([path, data]) => [path, known[path] !== data.hash ? data : {
+                hash: data.hash,
+                s: hits(data.s),
+                f: hits(data.f),
+                b: hits(data.b),
+                ...(data.bT ? {bT: hits(data.bT)} : {})
+            }]
+        ));
+    """
+
+    # Counter fields of the file coverage data.
+    COUNTERS = ('s', 'f', 'b', 'bT')
+
+    def __init__(self):
+        self._files = {}
+        self._known = {}
+        self._lock = Lock()
+
+    def files(self):
+        """
+        Retrieve a dictionary of paths and hashes of the files for which full
+        coverage data has been provided, such that only hit counters need to
+        be provided for them in later deltas.
+        """
+
+        return self._known.copy()
+
+    def register(self, delta):
+        """
+        Mark the files with full coverage data in the `delta` as known.
+        """
+
+        for path, data in delta.items():
+            if 'statementMap' in data:
+                self._known[path] = data['hash']
+
+    def merge(self, delta):
+        """
+        Include the hit counters of a coverage `delta` in the combined data.
+        """
+
+        with self._lock:
+            for path, data in delta.items():
+                current = self._files.get(path)
+                if current is None or current['hash'] != data['hash']:
+                    if 'statementMap' not in data:
+                        raise ValueError(f'Missing coverage data for {path}')
+
+                    self._files[path] = data
+                    continue
+
+                for counter in self.COUNTERS:
+                    for key, count in data.get(counter, {}).items():
+                        if isinstance(count, list):
+                            current[counter][key] = [
+                                total + branch for total, branch
+                                in zip(current[counter][key], count)
+                            ]
+                        else:
+                            current[counter][key] += count
+
+    def write(self, filename):
+        """
+        Write the combined coverage data to a JSON file.
+        """
+
+        with self._lock:
+            with open(filename, 'w', encoding='utf-8') as coverage_file:
+                json.dump(self._files, coverage_file)
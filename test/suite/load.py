@@ -0,0 +1,176 @@
+"""
+HTTP client and result summaries for load tests of the proxy.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import asyncio
+from urllib.parse import urlsplit
+
+# Percentiles of the latencies to report.
+PERCENTILES = (50, 90, 95, 99)
+
+# Exceptions that indicate that a request failed.
+REQUEST_ERRORS = (
+    OSError, ValueError, IndexError, asyncio.TimeoutError,
+    asyncio.IncompleteReadError
+)
+
+def summarize(result, elapsed):
+    """
+    Determine the throughput, latency percentiles in milliseconds and status
+    counts of requests from their `latencies` in seconds, `status` counter and
+    number of `bytes` in the response bodies.
+    """
+
+    latencies = sorted(result['latencies'])
+    count = sum(result['status'].values())
+    return {
+        'requests': count,
+        'throughput': count / elapsed if elapsed else 0,
+        'errors': result['status']['error'] + sum(
+            number for status, number in result['status'].items()
+            if status != 'error' and int(status) >= 500
+        ),
+        'status': dict(result['status']),
+        'bytes': result['bytes'],
+        'latency': {
+            f'p{percentile}': latencies[
+                min(len(latencies) - 1, int(len(latencies) * percentile / 100))
+            ] * 1000 if latencies else None
+            for percentile in PERCENTILES
+        }
+    }
+
+class Connection:
+    """
+    Persistent HTTP/1.1 connection to a server.
+    """
+
+    def __init__(self, host, port):
+        self._host = host
+        self._port = port
+        self._reader = None
+        self._writer = None
+
+    async def close(self):
+        """
+        Close the connection if it is open.
+        """
+
+        if self._writer is not None:
+            self._writer.close()
+            try:
+                await self._writer.wait_closed()
+            except OSError:
+                pass
+
+        self._reader = None
+        self._writer = None
+
+    async def _read_body(self, headers):
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            size = 0
+            while True:
+                line = await self._reader.readline()
+                length = int(line.split(b';', 1)[0], 16)
+                if length == 0:
+                    # Skip trailers until the empty line
+                    while (await self._reader.readline()).strip():
+                        pass
+                    return size
+
+                await self._reader.readexactly(length + 2)
+                size += length
+
+        if 'content-length' in headers:
+            length = int(headers['content-length'])
+            await self._reader.readexactly(length)
+            return length
+
+        body = await self._reader.read()
+        await self.close()
+        return len(body)
+
+    async def _send(self, method, url, body):
+        # Write the request, opening the connection if necessary, and read the
+        # status line of the response
+        parts = urlsplit(url)
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(
+                self._host, self._port
+            )
+
+        path = parts.path + (f'?{parts.query}' if parts.query else '')
+        lines = [
+            f'{method} {path} HTTP/1.1',
+            f'Host: {parts.netloc}',
+            'User-Agent: visualization-site-load-test',
+            'Accept-Encoding: gzip',
+            'Connection: keep-alive'
+        ]
+        if body is not None:
+            lines.extend([
+                'Content-Type: application/x-www-form-urlencoded',
+                f'Content-Length: {len(body)}'
+            ])
+        self._writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('ascii'))
+        if body is not None:
+            self._writer.write(body)
+        await self._writer.drain()
+        return await self._reader.readline()
+
+    async def request(self, method, url, body=None):
+        """
+        Perform a request and read the response. Returns the status code and
+        the size of the response body.
+
+        If a persistent connection that was used before fails before the
+        status line is read, for example because the server closed it after
+        its keep-alive timeout, then the request is tried once more on a new
+        connection.
+        """
+
+        reused = self._writer is not None
+        try:
+            status_line = await self._send(method, url, body)
+        except OSError:
+            if not reused:
+                raise
+            status_line = b''
+
+        if not status_line and reused:
+            await self.close()
+            status_line = await self._send(method, url, body)
+        if not status_line:
+            raise ConnectionResetError('Connection closed by server')
+        status = int(status_line.split(b' ', 2)[1])
+        headers = {}
+        while True:
+            line = (await self._reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+        size = 0
+        if method != 'HEAD' and status not in (204, 304) and status >= 200:
+            size = await self._read_body(headers)
+        if headers.get('connection', '').lower() == 'close':
+            await self.close()
+
+        return status, size
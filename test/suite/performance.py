@@ -0,0 +1,178 @@
+"""
+Performance measurements of the pages visited by the tests.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import os
+from selenium.common.exceptions import WebDriverException
+
+class Performance:
+    """
+    Timing entries and metrics of the pages that a test navigates to.
+    """
+
+    # Script that starts observing long tasks in the current page, if this is
+    # not yet done, and returns the time origin of the page and the time since
+    # the navigation started.
+    OBSERVE_SCRIPT = """
+        if (!window.__longTasks__) {
+            window.__longTasks__ = [];
+            try {
+                new PerformanceObserver((list) => {
+                    window.__longTasks__.push(...list.getEntries().map(
+                        (entry) => ({
+                            startTime: entry.startTime,
+                            duration: entry.duration
+                        })
+                    ));
+                }).observe({type: 'longtask', buffered: true});
+            } catch (e) {
+                // Long tasks are not supported by the browser
+            }
+        }
+        return [performance.timeOrigin, performance.now()];
+    """
+
+    # Script that retrieves the timing entries of the current page.
+    CAPTURE_SCRIPT = """
+        const fields = [
+            'name', 'initiatorType', 'startTime', 'duration', 'transferSize',
+            'encodedBodySize', 'decodedBodySize'
+        ];
+        return {
+            origin: performance.timeOrigin,
+            url: window.location.href,
+            navigation: performance.getEntriesByType('navigation').map(
+                (entry) => entry.toJSON()
+            ),
+            resources: performance.getEntriesByType('resource').map(
+                (entry) => Object.fromEntries(
+                    fields.map((field) => [field, entry[field]])
+                )
+            ),
+            long_tasks: window.__longTasks__ || []
+        };
+    """
+
+    # Units of the metrics.
+    UNITS = {
+        'dom_content_loaded': 'ms',
+        'load': 'ms',
+        'ready': 'ms',
+        'resources': 'requests',
+        'transfer_size': 'bytes',
+        'long_tasks': 'ms'
+    }
+
+    def __init__(self):
+        self._ready = {}
+
+    def observe(self, driver):
+        """
+        Track the time until an awaited element appeared in the current page,
+        if this is the first element awaited since the page was navigated to.
+        """
+
+        try:
+            origin, ready = driver.execute_script(self.OBSERVE_SCRIPT)
+        except WebDriverException:
+            return
+
+        self._ready.setdefault(origin, ready)
+
+    def capture(self, driver):
+        """
+        Retrieve the timing entries of the current page, including metrics
+        derived from them.
+        """
+
+        data = driver.execute_script(self.CAPTURE_SCRIPT)
+        data['ready'] = self._ready.get(data['origin'])
+        data['metrics'] = self.metrics(data)
+        return data
+
+    @staticmethod
+    def metrics(data):
+        """
+        Determine metrics of page performance from the timing entries. Times
+        are in milliseconds since the navigation started and sizes in bytes.
+        Metrics are `None` if the page did not reach the relevant state.
+        """
+
+        navigation = data['navigation'][0] if data['navigation'] else {}
+        resources = data['resources']
+        return {
+            'dom_content_loaded':
+                navigation.get('domContentLoadedEventEnd') or None,
+            'load': navigation.get('loadEventEnd') or None,
+            'ready': data['ready'],
+            'resources': len(resources),
+            'transfer_size': navigation.get('transferSize', 0) +
+                sum(resource['transferSize'] or 0 for resource in resources),
+            'long_tasks': sum(task['duration'] for task in data['long_tasks'])
+        }
+
+class Budget:
+    """
+    Limits on the performance metrics of the tests.
+
+    The budget file is a JSON object with a `default` object of metric names
+    and their maximum values, and a `tests` object with test ID prefixes as
+    keys and objects of metric limits that override the defaults for the
+    tests that match them. Longer prefixes override shorter ones.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.getenv('VISUALIZATION_PERFORMANCE_BUDGET',
+                             'performance-budget.json')
+
+        try:
+            with open(path, 'r', encoding='utf-8') as budget_file:
+                budget = json.load(budget_file)
+        except FileNotFoundError:
+            budget = {}
+
+        self._default = budget.get('default', {})
+        self._tests = budget.get('tests', {})
+
+    def limits(self, name):
+        """
+        Retrieve the metric limits for the test with the given `name`.
+        """
+
+        limits = self._default.copy()
+        for prefix in sorted(self._tests, key=len):
+            if name.startswith(prefix):
+                limits.update(self._tests[prefix])
+
+        return limits
+
+    def check(self, name, metrics):
+        """
+        Compare the performance `metrics` of a test result to the budget.
+        Returns a list of messages for the metrics that exceed their limits.
+        """
+
+        return [
+            f'{metric} is {metrics[metric]:.0f}, exceeding budget of {limit}'
+            for metric, limit in self.limits(name).items()
+            if limit is not None and metrics.get(metric) is not None and
+            metrics[metric] > limit
+        ]
@@ -0,0 +1,99 @@
+"""
+Pipelined execution of tests while visualizations are being built.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import json
+import os
+import time
+import unittest
+from .shard import iter_tests
+
+# Build timings of visualizations that are done, written by readiness.py
+BUILDS_PATH = 'results/builds.json'
+
+def is_enabled():
+    """
+    Check whether tests should start while visualizations are being built.
+    """
+
+    return os.getenv('VISUALIZATION_TEST_PIPELINE') == 'true'
+
+def get_timeout():
+    """
+    Retrieve the number of seconds to wait for visualizations to be built.
+    """
+
+    return int(os.getenv('VISUALIZATION_MAX_SECONDS', '60'))
+
+def read_builds():
+    """
+    Retrieve the names of the visualizations whose builds are done.
+    """
+
+    try:
+        with open(BUILDS_PATH, 'r', encoding='utf-8') as builds_file:
+            return set(json.load(builds_file).keys())
+    except (FileNotFoundError, ValueError):
+        return set()
+
+def get_visualization(test):
+    """
+    Retrieve the name of the visualization that a `test` is gated on, or
+    `None` if the test does not depend on the build of a visualization.
+    """
+
+    # pylint: disable=protected-access
+    method = getattr(test, test._testMethodName, None)
+    return getattr(method, 'visualization', None)
+
+class PipelineSuite(unittest.TestSuite):
+    """
+    Test suite that runs tests as soon as the build of the visualization that
+    they test is done, keeping the original order of tests that can be run.
+    """
+
+    # Seconds between checks for builds that are done.
+    POLL_FREQUENCY = 0.5
+
+    # Tests are yielded out of order, so they cannot be removed by index.
+    _cleanup = False
+
+    def countTestCases(self):
+        return sum(test.countTestCases() for test in self._tests)
+
+    def __iter__(self):
+        pending = list(iter_tests(self._tests))
+        deadline = time.monotonic() + get_timeout()
+        while pending:
+            builds = read_builds()
+            ready = [
+                test for test in pending
+                if get_visualization(test) in builds | {None}
+            ]
+            if not ready:
+                if time.monotonic() < deadline:
+                    time.sleep(self.POLL_FREQUENCY)
+                    continue
+
+                # Let the tests report the missing builds
+                ready = pending
+
+            yield from ready
+
+            pending = [test for test in pending if test not in ready]
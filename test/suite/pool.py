@@ -0,0 +1,104 @@
+"""
+Pool of remote driver sessions shared between tests.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from selenium.common.exceptions import WebDriverException
+
+class SessionPool:
+    """
+    Pool of idle remote driver sessions that can be reused by tests instead of
+    starting a new browser for each test.
+    """
+
+    # Number of tests after which a session is quit rather than reused.
+    MAX_USES = 25
+
+    def __init__(self):
+        self._idle = []
+        self._uses = {}
+
+    def acquire(self):
+        """
+        Retrieve an idle session from the pool. Returns `None` if no sessions
+        are available, in which case a new session should be set up and then
+        registered with `add`.
+        """
+
+        if not self._idle:
+            return None
+
+        driver = self._idle.pop()
+        self._uses[driver] += 1
+        return driver
+
+    def add(self, driver):
+        """
+        Register a newly set up session that is in use by a test.
+        """
+
+        self._uses[driver] = 1
+
+    def release(self, driver):
+        """
+        Reset the state of a session that a test is done with and make it
+        available for other tests.
+
+        Cookies and local/session storage of the current page are removed and
+        the browser navigates to a blank page. If the reset fails or the
+        session has been used often, then the session is quit instead.
+        """
+
+        if self._uses.get(driver, self.MAX_USES) >= self.MAX_USES:
+            self.discard(driver)
+            return
+
+        try:
+            driver.delete_all_cookies()
+            driver.execute_script(
+                "try { window.localStorage.clear(); "
+                "window.sessionStorage.clear(); } catch (e) {}"
+            )
+            driver.get('about:blank')
+            # Drain the remaining browser log entries
+            driver.get_log('browser')
+        except WebDriverException:
+            self.discard(driver)
+            return
+
+        self._idle.append(driver)
+
+    def discard(self, driver):
+        """
+        Quit a session, for example because its state may be invalid after
+        a failed test.
+        """
+
+        self._uses.pop(driver, None)
+        try:
+            driver.quit()
+        except WebDriverException:
+            pass
+
+    def close(self):
+        """
+        Quit all the idle sessions.
+        """
+
+        while self._idle:
+            self.discard(self._idle.pop())
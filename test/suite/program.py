@@ -18,16 +18,21 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+from functools import partial
 from xmlrunner.runner import XMLTestProgram
 from .runner import Runner
+from .pipeline import PipelineSuite, is_enabled as is_pipelined
+from .shard import split_suite
 
 class Program(XMLTestProgram):
     """
     Test program.
     """
 
-    def __init__(self, *args, **kwargs):
-        kwargs.setdefault('testRunner', Runner)
+    def __init__(self, *args, shard=None, **kwargs):
+        kwargs.setdefault('testRunner', partial(Runner, shard=shard))
+        self._shard = shard
+        self.test = None
         self._main_parser = None
         self._discovery_parser = None
         self.output = 'junit'
@@ -44,6 +49,17 @@ class Program(XMLTestProgram):
         self._main_parser = self._getMainArgParser(parent_parser)
         self._discovery_parser = self._getDiscoveryArgParser(parent_parser)
 
+    def createTests(self, from_discovery=False, Loader=None):
+        """
+        Create the test suite, split into the configured shard if there is one.
+        """
+
+        super().createTests(from_discovery=from_discovery, Loader=Loader)
+        if self._shard is not None:
+            self.test = split_suite(self.test, *self._shard)
+        if is_pipelined():
+            self.test = PipelineSuite(self.test)
+
     def runTests(self):
         try:
             super().runTests()
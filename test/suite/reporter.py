@@ -21,27 +21,84 @@ limitations under the License.
 from collections import OrderedDict
 from contextlib import closing
 from datetime import datetime
+from hashlib import sha256
+import html
 from io import BytesIO
+import json
 import os
 from urllib.error import URLError
-from urllib.request import urlopen
+from urllib.request import Request, urlopen
 from zipfile import ZipFile
+from .accessibility import Accessibility
+from .artifacts import Artifacts
+from .coverage import Coverage
+from .performance import Performance
+from .visual import VisualRegression
 
-class Reporter:
+class Reporter: # pylint: disable=too-many-instance-attributes
     """
     Report handler for results and accessibility.
     """
 
-    def __init__(self):
+    # Collector that combines the coverage data uploaded by the tests.
+    COVERAGE_URL = 'http://coverage.test:8888'
+
+    def __init__(self, shard=None):
         """
         Set up the reports.
+
+        If `shard` is provided, then the reporter is used within a worker that
+        runs a part of the test suite. Instead of writing the indexes, the
+        reporter keeps the entries and stores them in a state file upon
+        closing, so that they can be merged using `merge_shard`.
+
+        If the environment variable `VISUALIZATION_COVERAGE_DELTA` is `true`,
+        then coverage data of the tests is provided as deltas which are
+        merged locally, rather than uploaded to the coverage collector.
+
+        Screenshots are compared to the baselines in the directory from the
+        environment variable `VISUALIZATION_SCREENSHOT_BASELINE`, and those
+        that are new or changed become the baselines if the environment
+        variable `VISUALIZATION_SCREENSHOT_UPDATE` is `true`.
+
+        Accessibility scans are only performed once for each page state, and
+        their violations are combined into a CSV report upon closing.
         """
 
+        self._shard = shard
         self._results_index = None
         self._accessibility_index = None
         self._browser_logs = OrderedDict()
+        # Entries that are kept until closing, or stored in the state file of
+        # a shard
+        self._state = {
+            'results': [],
+            'accessibility': [],
+            'performance': [],
+            'visual': []
+        }
+        self._artifacts = Artifacts()
+        self._accessibility = Accessibility()
+        # First test with a scan of each page state, for linking in the index
+        self._accessibility_tests = {}
+        self._visual = VisualRegression(
+            os.getenv('VISUALIZATION_SCREENSHOT_BASELINE', 'baseline'),
+            os.getenv('VISUALIZATION_SCREENSHOT_UPDATE') == 'true'
+        )
+        if os.getenv('VISUALIZATION_COVERAGE_DELTA') == 'true':
+            self._coverage = Coverage()
+        else:
+            self._coverage = None
+
+    @staticmethod
+    def _shard_path(shard):
+        index = shard[0] if isinstance(shard, tuple) else shard
+        return f'results/shard-{index}.json'
 
     def __enter__(self):
+        if self._shard is not None:
+            return self
+
         build_url = os.getenv('BUILD_URL', '')
         build_id = os.getenv('BUILD_NUMBER', '')
         configuration = [
@@ -69,28 +126,94 @@ class Reporter:
         self._accessibility_index.write('<!doctype html>\n<html>\n<head>\n')
         self._accessibility_index.write('<meta charset="utf-8">\n')
         self._accessibility_index.write('<title>Accessibility tests</title>\n')
+        self._accessibility_index.write('<style>table,th,td { ')
+        self._accessibility_index.write('border: .1rem solid #aaa; ')
+        self._accessibility_index.write('border-collapse: collapse }</style>\n')
         self._accessibility_index.write('</head>\n<body>\n')
         self._accessibility_index.write('<h1>Accessibility test results</h1>\n')
 
         return self
 
+    def _write_builds(self):
+        try:
+            with open('results/builds.json', 'r', encoding='utf-8') as builds:
+                timings = json.load(builds)
+        except FileNotFoundError:
+            return
+
+        self._results_index.write('<h2>Visualization builds</h2>\n<ul>\n')
+        for name, timing in timings.items():
+            duration = timing['duration']
+            seconds = f'{duration:.1f}s' if duration is not None else 'unknown'
+            exit_code = timing['exit_code']
+            self._results_index.write(f'<li>{name} ({seconds}, exit code {exit_code})</li>\n')
+        self._results_index.write('</ul>\n')
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
-    def write_result(self, name):
+    def submit(self, name, function, *args):
+        """
+        Perform a task that writes or uploads an artifact of the test result
+        with the given `name` in the background. Errors from the task are
+        reported when the reports are closed.
+        """
+
+        self._artifacts.submit(name, function, *args)
+
+    @staticmethod
+    def _write_screenshot(name, digest, screenshot):
+        # Identical screenshots are stored once, also across shards
+        path = f'results/screenshots/{digest}.png'
+        if os.path.exists(path):
+            return
+
+        os.makedirs('results/screenshots', exist_ok=True)
+        temp_path = f'results/screenshots/.{name}.png.tmp'
+        with open(temp_path, 'wb') as screenshot_file:
+            screenshot_file.write(screenshot)
+        try:
+            os.link(temp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(temp_path)
+
+    def write_result(self, name, screenshot=None, digest=None):
         """
         Write a link to a screenshot of a test result to the index.
 
         The `name` is the name of the test for which the screenshot was made.
+        If `screenshot` is provided, then it contains the PNG data, which is
+        written to the results directory by its hash and compared to the
+        baseline in the background. Otherwise, `digest` is the hash of the
+        screenshot that was already written.
         """
 
-        self._results_index.write(f'<li><a href="{name}.png">{name}</a></li>\n')
+        if screenshot is not None:
+            digest = sha256(screenshot).hexdigest()
+            self.submit(name, self._write_screenshot, name, digest, screenshot)
+            self._visual.submit(name, screenshot, digest)
+
+        if self._shard is not None:
+            self._state['results'].append([name, digest])
+            return
+
+        if digest is None:
+            self._results_index.write(f'<li>{name}</li>\n')
+        else:
+            self._results_index.write(f'<li><a href="screenshots/{digest}.png">{name}</a></li>\n')
 
     def write_log(self, name, log):
         """
-        Write a file with a browser log of a test result.
+        Write a file with a browser log of a test result in the background.
         """
 
+        self._browser_logs[name] = len(log)
+        self.submit(name, self._write_log_file, name, log)
+
+    @staticmethod
+    def _write_log_file(name, log):
         with open(f'results/{name}.html', 'w', encoding='utf-8') as results_log:
             results_log.write('<!doctype html>\n<html>\n<head>\n')
             results_log.write('<meta charset="utf-8">\n')
@@ -129,21 +252,214 @@ class Reporter:
             results_log.write(f'<p>Finished: {datetime.now().astimezone()}</p>')
             results_log.write('\n</body>\n</html>')
 
-        self._browser_logs[name] = len(log)
+    def _upload_coverage(self, coverage):
+        headers = {'Content-Type': 'application/json'}
+        request = Request(f'{self.COVERAGE_URL}/client',
+                          data=json.dumps(coverage).encode('utf-8'),
+                          headers=headers)
+        with closing(urlopen(request)) as response:
+            status_code = response.getcode()
+            if status_code != 200:
+                raise URLError('Server responsed with status code '
+                               f'{status_code}')
+
+    def coverage_files(self):
+        """
+        Retrieve the paths and hashes of files for which coverage deltas only
+        need to contain hit counters, or `None` if the coverage data of a test
+        result should be provided in full, because it is uploaded instead.
+        """
+
+        if self._coverage is None:
+            return None
+
+        return self._coverage.files()
+
+    def write_coverage(self, name, coverage):
+        """
+        Upload the coverage data of a test result to the collector, or merge
+        the coverage delta locally, in the background.
+        """
+
+        if self._coverage is None:
+            self.submit(f'{name} coverage', self._upload_coverage, coverage)
+        else:
+            # Deltas with only hit counters must be merged after the full
+            # coverage data of an earlier test result
+            self._coverage.register(coverage)
+            self._artifacts.submit_ordered(f'{name} coverage',
+                                           self._coverage.merge, coverage)
+
+    @staticmethod
+    def _write_accessibility_file(key, results):
+        with open(f'accessibility/{key}.json', 'w',
+                  encoding='utf-8') as accessibility_file:
+            json.dump(results, accessibility_file, indent=4)
+
+    def check_accessibility(self, name, driver):
+        """
+        Scan the accessibility of the current page of the `driver` for a test
+        result with the given `name`, unless the page state was already
+        scanned, and write its report to the index. The full axe results of
+        a new scan are written to a JSON file in the background.
+        """
+
+        key, scan, results = self._accessibility.scan(driver)
+        if results is not None:
+            self.submit(f'{name} accessibility',
+                        self._write_accessibility_file, key, results)
 
-    def write_accessibility(self, name, report):
+        self.write_accessibility(name, key)
+        return scan
+
+    def write_accessibility(self, name, key, scan=None):
         """
         Write an accessibility report of a test result to the index.
+
+        The `key` refers to the page state that was scanned. If `scan` is
+        provided, then it is the scan of the page state, for example from
+        a worker that ran a shard of the tests.
+        """
+
+        if scan is not None:
+            self._accessibility.add(key, scan)
+
+        self._state['accessibility'].append([name, key])
+        if self._shard is not None:
+            return
+
+        self._accessibility_index.write(f'<h2 id="{name}">{name}</h2>\n')
+        if key in self._accessibility_tests:
+            first = self._accessibility_tests[key]
+            self._accessibility_index.write('<p>Same page state as ')
+            self._accessibility_index.write(f'<a href="#{first}">{first}</a></p>\n')
+        else:
+            self._accessibility_tests[key] = name
+            report = self._accessibility.get(key)['report']
+            self._accessibility_index.write(f'<pre>{report}</pre>\n')
+
+    def _write_accessibility(self):
+        tests = self._state['accessibility']
+        self._accessibility.write_csv('accessibility/report.csv', tests)
+
+        self._accessibility_index.write('<h2>Summary</h2>\n')
+        self._accessibility_index.write(f'<p>{len(self._accessibility_tests)} ')
+        self._accessibility_index.write(f'page states scanned for {len(tests)} ')
+        self._accessibility_index.write('tests, <a href="report.csv">')
+        self._accessibility_index.write('violations in CSV</a></p>\n')
+        self._accessibility_index.write('<table>\n<thead>\n<tr><th>Rule</th>')
+        self._accessibility_index.write('<th>Impact</th><th>Help</th>')
+        self._accessibility_index.write('<th>Tests</th><th>Elements</th></tr>\n')
+        self._accessibility_index.write('</thead>\n<tbody>\n')
+        for rule in self._accessibility.summary(tests):
+            self._accessibility_index.write(f"<tr><td>{rule['id']}</td>")
+            self._accessibility_index.write(f"<td>{rule['impact']}</td>")
+            self._accessibility_index.write(f"<td>{html.escape(rule['help'])}</td>")
+            self._accessibility_index.write(f"<td>{rule['tests']}</td>")
+            self._accessibility_index.write(f"<td>{rule['elements']}</td></tr>\n")
+        self._accessibility_index.write('</tbody>\n</table>\n')
+
+    @staticmethod
+    def _write_performance_file(name, performance):
+        with open(f'results/{name}.performance.json', 'w',
+                  encoding='utf-8') as performance_file:
+            json.dump(performance, performance_file, indent=4)
+
+    def write_performance(self, name, performance):
+        """
+        Write the timing entries and metrics of the page of a test result to
+        a JSON file in the background and keep the metrics for the index.
+        """
+
+        self._state['performance'].append([name, performance['metrics']])
+        self.submit(f'{name} performance', self._write_performance_file, name,
+                    performance)
+
+    def _write_performance(self):
+        self._results_index.write('</ul>\n<h2>Performance</h2>\n<ul>\n')
+        for name, metrics in self._state['performance']:
+            summary = ', '.join(
+                f'{metric.replace("_", " ")} {value:.0f} '
+                f'{Performance.UNITS[metric]}'
+                for metric, value in metrics.items() if value is not None
+            )
+            self._results_index.write(f'<li><a href="{name}.performance.json">')
+            self._results_index.write(f'{name}</a>: {summary}</li>\n')
+
+    def _write_visual(self):
+        if not self._visual.enabled:
+            return
+
+        self._results_index.write('</ul>\n<h2>Visual regression</h2>\n<ul>\n')
+        order = ('error', 'size', 'changed', 'tolerated', 'new', 'match')
+        changed = 0
+        for result in sorted(self._state['visual'],
+                             key=lambda result: order.index(result['status'])):
+            status = result['status']
+            if status in ('changed', 'size'):
+                changed += 1
+            if result['pixels']:
+                status += f", {result['pixels']} pixels ({result['ratio']:.2%})"
+            if result['diff'] is not None:
+                status += f', <a href="{result["diff"]}">diff</a>'
+            if 'error' in result:
+                status += f": {html.escape(result['error'])}"
+            screenshot = f'screenshots/{result["digest"]}.png'
+            self._results_index.write(f'<li><a href="{screenshot}">')
+            self._results_index.write(f'{result["name"]}</a>: {status}</li>\n')
+
+        if changed:
+            print(f'{changed} screenshots differ from their baseline')
+
+    def merge_shard(self, shard):
+        """
+        Include the entries of a reporter from a worker that ran the shard
+        with the index `shard` in the indexes of this reporter.
         """
 
-        self._accessibility_index.write(f'<h2>{name}</h2>\n')
-        self._accessibility_index.write(f'<pre>{report}</pre>\n')
+        path = self._shard_path(shard)
+        try:
+            with open(path, 'r', encoding='utf-8') as state_file:
+                state = json.load(state_file)
+        except FileNotFoundError:
+            print(f'No report state found for shard {shard}')
+            return
+
+        for name, digest in state['results']:
+            self.write_result(name, digest=digest)
+        self._browser_logs.update(state['browser_logs'])
+        self._state['performance'].extend(state['performance'])
+        self._state['visual'].extend(state['visual'])
+        for name, key in state['accessibility']:
+            self.write_accessibility(name, key, state['scans'][key])
+        self._artifacts.errors.extend(state['errors'])
+
+        os.remove(path)
 
     def close(self):
         """
         Close the reports.
         """
 
+        self._artifacts.close()
+        errors = self._artifacts.errors
+        self._state['visual'].extend(self._visual.results())
+
+        if self._coverage is not None:
+            index = f'-{self._shard[0]}' if self._shard is not None else ''
+            self._coverage.write(f'coverage/output/out{index}.json')
+
+        if self._shard is not None:
+            self._state['browser_logs'] = list(self._browser_logs.items())
+            self._state['errors'] = errors
+            self._state['scans'] = self._accessibility.scans(
+                key for _, key in self._state['accessibility']
+            )
+            with open(self._shard_path(self._shard), 'w',
+                      encoding='utf-8') as state_file:
+                json.dump(self._state, state_file)
+            return
+
         with open('results/log.css', 'w', encoding='utf-8') as log_stylesheet:
             log_stylesheet.write("""
 table,th,td {
@@ -158,15 +474,30 @@ dt {
         for name, size in self._browser_logs.items():
             self._results_index.write(f'<li><a href="{name}.html">{name} ({size} lines)</a></li>\n')
 
+        self._write_visual()
+        self._write_performance()
+
+        if errors:
+            self._results_index.write('</ul>\n<h2>Artifact errors</h2>\n<ul>\n')
+            for name, error in errors:
+                print(f'Could not write artifact for {name}: {error}')
+                self._results_index.write(f'<li>{name}: {html.escape(error)}</li>\n')
+
+        self._results_index.write('</ul>\n')
+        self._write_builds()
+
         # Docker container logs are appended to the index by run-tests.sh
         # Do not close the HTML here
-        self._results_index.write('</ul>\n')
         self._results_index.close()
 
+        self._write_accessibility()
         self._accessibility_index.write('</body>\n</html>')
         self._accessibility_index.close()
 
-        coverage_url = 'http://coverage.test:8888'
+        if self._coverage is not None:
+            return
+
+        coverage_url = self.COVERAGE_URL
 
         try:
             with closing(urlopen(f'{coverage_url}/download')) as zip_response:
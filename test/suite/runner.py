@@ -19,6 +19,7 @@ limitations under the License.
 """
 
 import xmlrunner
+from .base import IntegrationTest
 from .reporter import Reporter
 from .result import Result
 
@@ -27,8 +28,9 @@ class Runner(xmlrunner.XMLTestRunner):
     Test runner.
     """
 
-    def __init__(self, **kwargs):
+    def __init__(self, shard=None, **kwargs):
         super().__init__(**kwargs)
+        self._shard = shard
         self._reporter = None
         self.resultclass = Result
 
@@ -37,8 +39,11 @@ class Runner(xmlrunner.XMLTestRunner):
                                 self._reporter)
 
     def run(self, test):
-        with Reporter() as self._reporter:
-            return super().run(test)
+        with Reporter(shard=self._shard) as self._reporter:
+            try:
+                return super().run(test)
+            finally:
+                IntegrationTest.sessions.close()
 
     def cleanup(self):
         """
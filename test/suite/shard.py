@@ -0,0 +1,59 @@
+"""
+Distribution of the test suite across shards for parallel execution.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from collections import OrderedDict
+import unittest
+
+def iter_tests(suite):
+    """
+    Iterate over the test cases within a (nested) `suite`.
+    """
+
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            yield from iter_tests(test)
+        else:
+            yield test
+
+def split_suite(suite, index, count):
+    """
+    Select the tests from the `suite` that belong to the shard with the given
+    `index` out of `count` shards.
+
+    Tests are kept together per test case class, such that class fixtures and
+    JUnit XML output files (one per class) remain within one shard. Classes
+    are distributed by placing the classes with the most tests first onto the
+    shard with the fewest tests so far, which is deterministic across workers.
+    """
+
+    classes = OrderedDict()
+    for test in iter_tests(suite):
+        classes.setdefault(test.__class__, []).append(test)
+
+    sizes = [0] * count
+    shard = unittest.TestSuite()
+    ordered = sorted(classes.values(), key=len, reverse=True)
+    for tests in ordered:
+        target = sizes.index(min(sizes))
+        sizes[target] += len(tests)
+        if target == index:
+            shard.addTests(tests)
+
+    return shard
@@ -0,0 +1,227 @@
+"""
+Visual regression of browser screenshots against stored baselines.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha256
+from io import BytesIO
+import os
+from pathlib import Path
+import shutil
+
+def load_modules():
+    """
+    Import the optional NumPy and Pillow modules. Returns a tuple of the
+    `numpy` module and the `PIL.Image` module, or `None` if either of them is
+    not installed.
+    """
+
+    try:
+        # pylint: disable=import-outside-toplevel
+        import numpy
+        from PIL import Image
+    except ImportError:
+        return None
+
+    return numpy, Image
+
+def _read_pixels(numpy, image, data):
+    with image.open(BytesIO(data)) as png:
+        return numpy.asarray(png.convert('RGBA'))
+
+def compare_screenshot(screenshot, baseline, mask, options):
+    """
+    Compare the PNG data of a `screenshot` to the PNG data of a `baseline`.
+
+    Pixels where a color channel differs more than the `threshold` in the
+    `options` are changed, unless they are opaque in the PNG data of the
+    `mask`, if provided. If there are changed pixels, then an image that
+    highlights them on a faded baseline is written to the `diff` path in the
+    `options`. Returns a dictionary with the status of the comparison, the
+    number and fraction of changed pixels and the path of the diff image.
+    """
+
+    numpy, image = load_modules()
+    current = _read_pixels(numpy, image, screenshot).astype(numpy.int16)
+    expected = _read_pixels(numpy, image, baseline).astype(numpy.int16)
+
+    if current.shape != expected.shape:
+        return {
+            'status': 'size',
+            'pixels': None,
+            'ratio': 1.0,
+            'diff': None
+        }
+
+    changed = numpy.abs(current - expected).max(axis=2) > options['threshold']
+    if mask is not None:
+        ignore = _read_pixels(numpy, image, mask)[..., 3] > 0
+        if ignore.shape == changed.shape:
+            changed &= ~ignore
+
+    pixels = int(numpy.count_nonzero(changed))
+    if pixels == 0:
+        return {'status': 'match', 'pixels': 0, 'ratio': 0.0, 'diff': None}
+
+    # Faded grayscale version of the baseline with changed pixels in red
+    faded = (expected[..., :3].mean(axis=2) / 4 + 191).astype(numpy.uint8)
+    output = numpy.repeat(faded[..., numpy.newaxis], 3, axis=2)
+    output[changed] = (255, 0, 0)
+    image.fromarray(output, 'RGB').save(options['diff'], optimize=False)
+
+    ratio = pixels / changed.size
+    return {
+        'status': 'changed' if ratio > options['max_ratio'] else 'tolerated',
+        'pixels': pixels,
+        'ratio': ratio,
+        'diff': options['diff']
+    }
+
+class VisualRegression:
+    """
+    Comparison of screenshots of test results to baseline screenshots in
+    a pool of worker processes, such that tests are not held up.
+
+    Identical screenshots are only compared once to the same baseline.
+    """
+
+    # Number of processes that compare screenshots in the background.
+    WORKERS = 2
+
+    # Difference of a color channel of a pixel that is still considered equal,
+    # for example due to antialiasing of fonts.
+    THRESHOLD = 16
+
+    # Fraction of pixels that may differ before a screenshot is changed.
+    MAX_RATIO = 0.001
+
+    def __init__(self, baseline, update=False):
+        self._baseline = Path(baseline)
+        self._update = update
+        self._modules = load_modules()
+        self._executor = None
+        self._comparisons = {}
+        self._pending = []
+
+    @property
+    def enabled(self):
+        """
+        Whether screenshots are compared, which requires NumPy and Pillow.
+        """
+
+        return self._modules is not None
+
+    def _read_baseline(self, name, suffix='.png'):
+        try:
+            with open(self._baseline / f'{name}{suffix}', 'rb') as baseline:
+                return baseline.read()
+        except FileNotFoundError:
+            return None
+
+    def submit(self, name, screenshot, digest):
+        """
+        Compare the PNG data of a `screenshot` of the test result with the
+        given `name`, which has the SHA-256 hex `digest`, to its baseline in
+        the background.
+        """
+
+        if not self.enabled:
+            return
+
+        baseline = self._read_baseline(name)
+        if baseline is None:
+            self._pending.append((name, digest, {
+                'status': 'new', 'pixels': None, 'ratio': None, 'diff': None
+            }))
+            return
+
+        baseline_digest = sha256(baseline).hexdigest()
+        if baseline_digest == digest:
+            self._pending.append((name, digest, {
+                'status': 'match', 'pixels': 0, 'ratio': 0.0, 'diff': None
+            }))
+            return
+
+        mask = self._read_baseline(name, '.mask.png')
+        key = (digest, baseline_digest,
+               sha256(mask).hexdigest() if mask is not None else None)
+        if key not in self._comparisons:
+            if self._executor is None:
+                os.makedirs('results/diffs', exist_ok=True)
+                self._executor = ProcessPoolExecutor(max_workers=self.WORKERS)
+
+            self._comparisons[key] = self._executor.submit(
+                compare_screenshot, screenshot, baseline, mask, {
+                    'threshold': self.THRESHOLD,
+                    'max_ratio': self.MAX_RATIO,
+                    'diff': f'results/diffs/{digest[:16]}-{baseline_digest[:16]}.png'
+                }
+            )
+
+        self._pending.append((name, digest, self._comparisons[key]))
+
+    def _store_baseline(self, name, digest):
+        path = self._baseline / f'{name}.png'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(f'results/screenshots/{digest}.png', path)
+
+    def results(self):
+        """
+        Wait for the comparisons to be done and stop the worker processes.
+
+        Returns a list of dictionaries with the `name` and `digest` of each
+        screenshot and the status of its comparison. If baselines are updated,
+        then the screenshots that are new or changed become the baselines.
+        The screenshots must then have been written to the results already,
+        otherwise the result has an error status.
+        """
+
+        results = []
+        for name, digest, comparison in self._pending:
+            if isinstance(comparison, dict):
+                result = comparison.copy()
+            elif comparison.exception() is not None:
+                result = {
+                    'status': 'error', 'pixels': None, 'ratio': None,
+                    'diff': None, 'error': str(comparison.exception())
+                }
+            else:
+                result = comparison.result().copy()
+
+            if result['diff'] is not None:
+                result['diff'] = os.path.relpath(result['diff'], 'results')
+            if self._update and result['status'] in ('new', 'changed', 'size'):
+                try:
+                    self._store_baseline(name, digest)
+                except OSError as error:
+                    # The screenshot could not be written to the results
+                    result.update({
+                        'status': 'error',
+                        'error': f'Could not store baseline: {error}'
+                    })
+
+            result.update({'name': name, 'digest': digest})
+            results.append(result)
+
+        self._pending = []
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+        return results
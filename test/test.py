@@ -18,9 +18,12 @@ See the License for the specific language governing permissions and
 limitations under the License.
 """
 
+from multiprocessing import Process
+import os
 import sys
 import suite
 from suite.program import Program
+from suite.reporter import Reporter
 
 def load_tests(loader, tests, pattern):
     """
@@ -30,11 +33,48 @@ def load_tests(loader, tests, pattern):
     tests.addTests(loader.loadTestsFromModule(suite, pattern))
     return tests
 
+def run_shard(index, count):
+    """
+    Run a part of the test suite in a worker process.
+    """
+
+    program = Program(catchbreak=False, exit=False, shard=(index, count))
+    sys.exit(0 if program.result.wasSuccessful() else 1)
+
+def run_shards(count):
+    """
+    Run the test suite split across `count` worker processes, each with their
+    own remote driver sessions, and merge their reports afterward.
+    """
+
+    status = 0
+    with Reporter() as reporter:
+        processes = [
+            Process(target=run_shard, args=(index, count),
+                    name=f'shard-{index}')
+            for index in range(count)
+        ]
+        for process in processes:
+            process.start()
+
+        for index, process in enumerate(processes):
+            process.join()
+            if process.exitcode != 0:
+                status = 1
+
+            reporter.merge_shard(index)
+
+    return status
+
 def main():
     """
     Main entry point.
     """
 
+    shards = int(os.getenv('VISUALIZATION_TEST_SHARDS', '1'))
+    if shards > 1:
+        return run_shards(shards)
+
     program = Program(catchbreak=False, exit=False)
     return 0 if program.result.wasSuccessful() else 1
 
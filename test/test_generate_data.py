@@ -0,0 +1,83 @@
+"""
+Tests for generating sample data from the JSON schemas.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+import importlib.util
+import json
+from pathlib import Path
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+import unittest
+
+ROOT = Path(__file__).resolve().parent.parent
+
+@unittest.skipUnless(importlib.util.find_spec('jsonschema'),
+                     'The jsonschema package is not installed')
+class GenerateDataTest(unittest.TestCase):
+    """
+    Tests for the sample data generator.
+    """
+
+    SCALE = 10
+
+    @classmethod
+    def setUpClass(cls):
+        cls._directory = TemporaryDirectory() # pylint: disable=consider-using-with
+        cls.output = Path(cls._directory.name)
+        cls.process = subprocess.run([
+            sys.executable, 'test/generate_data.py', str(cls.output),
+            '--scale', str(cls.SCALE), '--validate'
+        ], cwd=ROOT, capture_output=True, check=False, text=True)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls._directory.cleanup()
+
+    def _load(self, path):
+        with open(self.output / path, 'r', encoding='utf-8') as data_file:
+            return json.load(data_file)
+
+    def test_validate(self):
+        """
+        Test that the generated data conforms to the schemas.
+        """
+
+        self.assertEqual(self.process.returncode, 0,
+                         self.process.stdout + self.process.stderr)
+
+    def test_projects(self):
+        """
+        Test that each project in the metadata has a directory and counts.
+        """
+
+        for visualization in ('sprint-report', 'prediction-site'):
+            with self.subTest(visualization=visualization):
+                data = Path(visualization, 'data')
+                projects = self._load(data / 'projects_meta.json')
+                self.assertEqual(len(projects), self.SCALE)
+                for project in projects:
+                    self.assertTrue((self.output / data /
+                                     project['name']).is_dir())
+                    for key in ('team', 'num_sprints', 'future_sprints'):
+                        if key in project:
+                            self.assertIsInstance(project[key], int)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,629 @@
+"""
+Validate visualization data files against the JSON schemas.
+
+Copyright 2017-2020 ICTU
+Copyright 2017-2022 Leiden University
+Copyright 2017-2023 Leon Helwerda
+
+Licensed under the Apache License, Version 2.0 (the "License");
+you may not use this file except in compliance with the License.
+You may obtain a copy of the License at
+
+    http://www.apache.org/licenses/LICENSE-2.0
+
+Unless required by applicable law or agreed to in writing, software
+distributed under the License is distributed on an "AS IS" BASIS,
+WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+See the License for the specific language governing permissions and
+limitations under the License.
+"""
+
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from fnmatch import fnmatch
+from functools import partial
+import json
+import os
+from pathlib import Path
+import re
+import sys
+from urllib.parse import quote, urljoin
+from jsonschema.exceptions import SchemaError
+from jsonschema.validators import validator_for
+from referencing import Registry, Resource
+from referencing.exceptions import NoSuchResource, Unresolvable
+
+def parse_args():
+    """
+    Parse command line arguments.
+    """
+
+    parser = ArgumentParser(description='Validate data files with schemas')
+    parser.add_argument('--samples', default='test/schema-samples.json',
+                        help='JSON file with glob patterns of data files and '
+                        'the schemas to validate them with')
+    parser.add_argument('--data', default='test/sample',
+                        help='Directory that the glob patterns are relative to')
+    parser.add_argument('--schema', default='schema',
+                        help='Directory with the JSON schemas')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(),
+                        help='Number of processes to validate files with')
+    parser.add_argument('--stream', action='store_true', default=False,
+                        help='Read the files incrementally and validate their '
+                        'records as they arrive, with bounded memory use')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='Maximum number of violations to report per file')
+    parser.add_argument('--depth', type=int, default=1,
+                        help='Number of nesting levels of arrays and objects '
+                        'to split into records when streaming')
+    parser.add_argument('--allow-missing', action='store_true', default=False,
+                        help='Do not fail on patterns that match no files')
+    return parser.parse_args()
+
+def json_pointer(parts):
+    """
+    Format the keys and indexes of a path into a JSON document as a JSON
+    pointer.
+    """
+
+    return ''.join(
+        '/' + str(part).replace('~', '~0').replace('/', '~1') for part in parts
+    )
+
+# Number of characters to read from a data file at a time when streaming.
+CHUNK_SIZE = 1024 * 1024
+
+# Tokens that change the nesting level of JSON text, and complete strings that
+# are skipped. A lone quote is the start of a string that is not yet read.
+TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[\[\]{}"]')
+
+# Text of a number, boolean or null.
+SCALAR = re.compile(r'[^\s,\]}]+')
+
+# Keywords that a schema of an array or object may have to be validated by its
+# records. Other keywords, such as combinations of schemas or unique items,
+# require the entire value.
+STREAM_KEYWORDS = {
+    '$id', '$schema', '$comment', '$defs', 'definitions', 'title',
+    'description', 'default', 'examples', 'type', 'items', 'properties',
+    'patternProperties', 'additionalProperties', 'required', 'minItems',
+    'maxItems', 'minProperties', 'maxProperties'
+}
+
+# Keywords besides a reference of a schema that only refers to another schema.
+REFERENCE_KEYWORDS = {
+    '$ref', '$id', '$schema', '$comment', '$defs', 'definitions', 'title',
+    'description', 'default', 'examples'
+}
+
+class JSONStream:
+    """
+    Incremental reader of JSON text, which only keeps the text of the current
+    value in memory. Arrays and objects can be read as a sequence of items.
+    """
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._offset = 0
+
+    def _read(self):
+        chunk = self._stream.read(self._chunk_size)
+        if chunk:
+            self._buffer += chunk
+        else:
+            self._eof = True
+
+    def _discard(self, force=False):
+        # Drop text that was read, once it is worth copying the remainder
+        if not force and self._pos < self._chunk_size:
+            return
+
+        self._offset += self._pos
+        self._buffer = self._buffer[self._pos:]
+        self._pos = 0
+
+    @property
+    def offset(self):
+        """
+        Number of characters before the current position in the text.
+        """
+
+        return self._offset + self._pos
+
+    def peek(self):
+        """
+        Skip whitespace and return the next character, or an empty string at
+        the end of the text.
+        """
+
+        while True:
+            while self._pos < len(self._buffer) and \
+                    self._buffer[self._pos] in ' \t\n\r':
+                self._pos += 1
+            if self._pos < len(self._buffer) or self._eof:
+                break
+            self._discard(force=True)
+            self._read()
+
+        return self._buffer[self._pos:self._pos + 1]
+
+    def expect(self, characters):
+        """
+        Consume the next character, which must be one of the `characters`.
+        """
+
+        character = self.peek()
+        if character == '' or character not in characters:
+            raise ValueError(f'Expected one of {characters!r} at offset '
+                             f'{self.offset}, found {character!r}')
+        self._pos += 1
+        return character
+
+    def _end(self):
+        # Determine the end position of the value at the current position
+        end = self._pos
+        if self._buffer[end] not in '[{"':
+            match = SCALAR.match(self._buffer, end)
+            while match is not None and match.end() == len(self._buffer) and \
+                    not self._eof:
+                self._read()
+                match = SCALAR.match(self._buffer, end)
+            if match is None:
+                raise ValueError(f'Expected a value at offset {self.offset}')
+            return match.end()
+
+        depth = 0
+        while True:
+            match = TOKEN.search(self._buffer, end)
+            if match is None or match.group() == '"':
+                # Read more text until a token or a whole string is available
+                if self._eof:
+                    raise ValueError('Unexpected end of JSON in value at '
+                                     f'offset {self.offset}')
+                self._read()
+                continue
+
+            end = match.end()
+            token = match.group()
+            if token in '[{':
+                depth += 1
+            elif token in ']}':
+                depth -= 1
+            if depth == 0:
+                return end
+
+    def value(self):
+        """
+        Read and decode the next value.
+        """
+
+        if self.peek() == '':
+            raise ValueError(f'Unexpected end of JSON at offset {self.offset}')
+
+        end = self._end()
+        try:
+            value = json.loads(self._buffer[self._pos:end])
+        except ValueError as error:
+            raise ValueError(f'{error} in value at offset {self.offset}') \
+                from error
+        self._pos = end
+        self._discard()
+        return value
+
+    def items(self):
+        """
+        Read an array. Yields the index of each item, after which the caller
+        must read the item.
+        """
+
+        self.expect('[')
+        if self.peek() == ']':
+            self._pos += 1
+            return
+
+        index = 0
+        while True:
+            yield index
+            index += 1
+            if self.expect(',]') == ']':
+                return
+
+    def members(self):
+        """
+        Read an object. Yields the key of each member, after which the caller
+        must read the value.
+        """
+
+        self.expect('{')
+        if self.peek() == '}':
+            self._pos += 1
+            return
+
+        while True:
+            if self.peek() != '"':
+                raise ValueError(f'Expected a key at offset {self.offset}')
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.expect(',}') == '}':
+                return
+
+    def end(self):
+        """
+        Check that only whitespace follows the value that was read.
+        """
+
+        if self.peek() != '':
+            raise ValueError(f'Extra data at offset {self.offset}')
+
+class ViolationLimit(Exception):
+    """
+    Signal that the maximum number of violations of a file has been found.
+    """
+
+class Schemas:
+    """
+    Collection of the JSON schemas in a directory, which are checked against
+    their metaschemas once and refer to each other through one registry.
+    """
+
+    def __init__(self, directory):
+        self._directory = Path(directory).resolve()
+        self._validators = {}
+        self._subschema_validators = {}
+        self._resolved = {}
+        resources = []
+        self.count = 0
+        for path in sorted(self._directory.glob('**/*.json')):
+            with path.open('r', encoding='utf-8') as schema_file:
+                contents = json.load(schema_file)
+
+            validator_for(contents).check_schema(contents)
+            resource = Resource.from_contents(contents)
+            # Schemas may be referred to by their identifier or by file name
+            resources.append((path.as_uri(), resource))
+            if resource.id() is not None:
+                resources.append((resource.id(), resource))
+            self.count += 1
+
+        self._registry = Registry().with_resources(resources)
+
+    def uri(self, reference):
+        """
+        Convert a schema reference, which is a path relative to the schema
+        directory with an optional JSON pointer fragment, to an absolute URI.
+        """
+
+        name, _, fragment = reference.partition('#')
+        return f'{(self._directory / name).as_uri()}#{fragment}'
+
+    def lookup(self, uri):
+        """
+        Retrieve the contents of the schema or part of a schema at an absolute
+        URI, without following references.
+        """
+
+        return self._registry.resolver().lookup(uri).contents
+
+    def resolve(self, uri):
+        """
+        Look up the schema at an absolute URI, following references that make
+        up the entire schema. Returns the URI and contents of the schema.
+        """
+
+        if uri in self._resolved:
+            return self._resolved[uri]
+
+        target = uri
+        schema = self._registry.resolver().lookup(target).contents
+        while isinstance(schema, dict) and '$ref' in schema and \
+                set(schema) <= REFERENCE_KEYWORDS:
+            target = urljoin(target, schema['$ref'])
+            if '#' not in target:
+                target += '#'
+            schema = self._registry.resolver().lookup(target).contents
+
+        self._resolved[uri] = (target, schema)
+        return target, schema
+
+    def validator(self, uri):
+        """
+        Retrieve a validator for the schema at an absolute URI.
+        """
+
+        if uri not in self._validators:
+            contents = self._registry.contents(uri.partition('#')[0])
+            cls = validator_for(contents)
+            schema = {'$ref': uri}
+            if '$schema' in contents:
+                schema['$schema'] = contents['$schema']
+            self._validators[uri] = cls(schema, registry=self._registry,
+                                        format_checker=cls.FORMAT_CHECKER)
+
+        return self._validators[uri]
+
+    def is_valid(self, value, schema, base):
+        """
+        Check whether a value conforms to a `schema` that is part of the schema
+        at the absolute URI `base`, against which its references resolve.
+        """
+
+        key = (base, json.dumps(schema, sort_keys=True))
+        if key not in self._subschema_validators:
+            contents = self._registry.contents(base.partition('#')[0])
+            cls = validator_for(contents)
+            self._subschema_validators[key] = cls(
+                schema, registry=self._registry,
+                format_checker=cls.FORMAT_CHECKER,
+                _resolver=self._registry.resolver(base.partition('#')[0])
+            )
+
+        return self._subschema_validators[key].is_valid(value)
+
+    def validate(self, path, reference, limit=None):
+        """
+        Validate a data file with a schema. Returns a list of tuples of JSON
+        pointers and messages of the violations, with at most `limit` items.
+        """
+
+        try:
+            with open(path, 'r', encoding='utf-8') as data_file:
+                data = json.load(data_file)
+        except (OSError, ValueError) as error:
+            return [('', f'Could not read JSON: {error}')]
+
+        try:
+            validator = self.validator(self.uri(reference))
+            errors = sorted((json_pointer(error.absolute_path), error.message)
+                            for error in validator.iter_errors(data))
+        except (NoSuchResource, Unresolvable) as error:
+            return [('', f'Could not resolve schema reference: {error}')]
+
+        return errors[:limit]
+
+class StreamValidator:
+    """
+    Validator of data files that reads them incrementally. Arrays and objects
+    whose schemas only describe their items or members are split into records
+    which are validated as they arrive, so that only one record is in memory.
+    """
+
+    def __init__(self, schemas, limit=None, depth=1):
+        self._schemas = schemas
+        self._limit = limit
+        self._depth = depth
+        self._errors = []
+
+    def _report(self, parts, message):
+        self._errors.append((json_pointer(parts), message))
+        if self._limit is not None and len(self._errors) >= self._limit:
+            raise ViolationLimit
+
+    def _record(self, stream, uri, parts):
+        value = stream.value()
+        for error in self._schemas.validator(uri).iter_errors(value):
+            self._report(parts + list(error.absolute_path), error.message)
+
+    def _items(self, stream, uri, schema, parts, depth):
+        count = 0
+        for index in stream.items():
+            if 'items' in schema:
+                self._check(stream, f'{uri}/items', parts + [index], depth)
+            else:
+                stream.value()
+            count += 1
+
+        return count
+
+    @staticmethod
+    def _subschemas(uri, schema, key):
+        # URIs of the schemas that apply to the value of a member
+        names = []
+        if key in schema.get('properties', {}):
+            names.append(('properties', key))
+        names.extend(('patternProperties', pattern)
+                     for pattern in schema.get('patternProperties', {})
+                     if re.search(pattern, key))
+        if not names and 'additionalProperties' in schema:
+            return [f'{uri}/additionalProperties']
+
+        return [
+            f'{uri}/{keyword}/{quote(json_pointer([name])[1:], safe="~")}'
+            for keyword, name in names
+        ]
+
+    def _members(self, stream, uri, schema, parts, depth):
+        keys = set()
+        for key in stream.members():
+            keys.add(key)
+            subschemas = self._subschemas(uri, schema, key)
+            if len(subschemas) == 1:
+                self._check(stream, subschemas[0], parts + [key], depth)
+            elif subschemas:
+                value = stream.value()
+                for subschema in subschemas:
+                    validator = self._schemas.validator(subschema)
+                    for error in validator.iter_errors(value):
+                        self._report(parts + [key] + list(error.absolute_path),
+                                     error.message)
+            else:
+                stream.value()
+
+        for key in schema.get('required', []):
+            if key not in keys:
+                self._report(parts, f'{key!r} is a required property')
+
+        return len(keys)
+
+    def _check(self, stream, uri, parts, depth):
+        uri, schema = self._schemas.resolve(uri)
+        kind = {'[': 'array', '{': 'object'}.get(stream.peek())
+        if depth <= 0 or kind is None or not isinstance(schema, dict) or \
+                schema.get('type') != kind or set(schema) - STREAM_KEYWORDS:
+            self._record(stream, uri, parts)
+            return
+
+        if kind == 'array':
+            count = self._items(stream, uri, schema, parts, depth - 1)
+            minimum, maximum = ('minItems', 'maxItems')
+        else:
+            count = self._members(stream, uri, schema, parts, depth - 1)
+            minimum, maximum = ('minProperties', 'maxProperties')
+
+        if count < schema.get(minimum, 0):
+            self._report(parts, f'Expected at least {schema[minimum]} '
+                         f'{"items" if kind == "array" else "properties"}, '
+                         f'found {count}')
+        if maximum in schema and count > schema[maximum]:
+            self._report(parts, f'Expected at most {schema[maximum]} '
+                         f'{"items" if kind == "array" else "properties"}, '
+                         f'found {count}')
+
+    def validate_stream(self, data_file, reference):
+        """
+        Validate JSON text from an open file with a schema while reading it.
+        Returns a list of tuples of JSON pointers and messages of the
+        violations, in the order in which they were found and at most the
+        limit.
+        """
+
+        self._errors = []
+        try:
+            stream = JSONStream(data_file)
+            self._check(stream, self._schemas.uri(reference), [], self._depth)
+            stream.end()
+        except ViolationLimit:
+            pass
+        except ValueError as error:
+            self._errors.append(('', f'Could not read JSON: {error}'))
+        except (NoSuchResource, Unresolvable) as error:
+            self._errors.append(
+                ('', f'Could not resolve schema reference: {error}')
+            )
+
+        return self._errors
+
+    def validate(self, path, reference):
+        """
+        Validate a data file with a schema while reading it.
+        """
+
+        try:
+            with open(path, 'r', encoding='utf-8') as data_file:
+                return self.validate_stream(data_file, reference)
+        except OSError as error:
+            return [('', f'Could not read JSON: {error}')]
+
+# Validator of data files in each worker process.
+_VALIDATOR = None
+
+def _load_schemas(directory, stream=False, limit=None, depth=1):
+    global _VALIDATOR # pylint: disable=global-statement
+    schemas = Schemas(directory)
+    if stream:
+        _VALIDATOR = StreamValidator(schemas, limit, depth).validate
+    else:
+        _VALIDATOR = partial(schemas.validate, limit=limit)
+
+def _validate(task):
+    path, reference = task
+    return path, reference, _VALIDATOR(path, reference)
+
+def find_files(samples, data, name=None):
+    """
+    Match the glob patterns of the samples against the data directory. If
+    a `name` is given, then the directory holds only that visualization, or
+    a subdirectory of it if the name has more components, and only the patterns
+    whose leading components match those of the name are used, without those
+    components. Returns a list of tuples of files and schema references, and
+    a list of patterns that matched no files.
+    """
+
+    prefix = name.split('/') if name is not None else []
+    tasks = []
+    missing = []
+    for pattern, reference in samples.items():
+        if prefix:
+            parts = pattern.split('/')
+            if len(parts) <= len(prefix) or \
+                not all(fnmatch(component, part)
+                        for component, part in zip(prefix, parts)):
+                continue
+            pattern = '/'.join(parts[len(prefix):])
+
+        paths = sorted(Path(data).glob(pattern))
+        if not paths:
+            missing.append(pattern)
+        tasks.extend((str(path), reference) for path in paths)
+
+    return tasks, missing
+
+def validate_files(directory, tasks, jobs, **options):
+    """
+    Validate data files in parallel processes which each load the schemas from
+    the directory once. The `stream`, `limit` and `depth` options select the
+    streaming validation and its settings. Yields tuples of the file, schema
+    reference and the violations, in the order of the tasks.
+    """
+
+    jobs = max(1, jobs or 1)
+    initargs = (directory, options.get('stream', False),
+                options.get('limit'), options.get('depth', 1))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_load_schemas,
+                             initargs=initargs) as executor:
+        yield from executor.map(_validate, tasks,
+                                chunksize=max(1, len(tasks) // (jobs * 4)))
+
+def check_files(directory, tasks, jobs, **options):
+    """
+    Validate data files in parallel processes and print their violations.
+    The `options` are passed to `validate_files`. Returns the number of files
+    with violations and the total number of violations.
+    """
+
+    failed = 0
+    violations = 0
+    for path, reference, errors in validate_files(directory, tasks, jobs,
+                                                  **options):
+        if errors:
+            failed += 1
+            violations += len(errors)
+        for pointer, message in errors:
+            print(f'{path}::{pointer or "/"} ({reference}): {message}')
+
+    return failed, violations
+
+def main():
+    """
+    Main entry point.
+    """
+
+    args = parse_args()
+    try:
+        schemas = Schemas(args.schema)
+    except (SchemaError, ValueError) as error:
+        print(f'Invalid schema: {error}', file=sys.stderr)
+        return 1
+
+    with open(args.samples, 'r', encoding='utf-8') as samples_file:
+        samples = json.load(samples_file)
+
+    tasks, missing = find_files(samples, args.data)
+    for pattern in missing:
+        print(f'{pattern}: no files match the pattern')
+
+    failed, violations = check_files(args.schema, tasks, args.jobs,
+                                     stream=args.stream, limit=args.limit,
+                                     depth=args.depth)
+
+    print(f'Validated {len(tasks)} files with {len(samples)} patterns against '
+          f'{schemas.count} schemas: {violations} violations in {failed} '
+          f'files, {len(missing)} patterns without files')
+    return 1 if failed or (missing and not args.allow_missing) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
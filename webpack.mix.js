@@ -19,6 +19,7 @@
  */
 const fs = require('fs'),
       path = require('path'),
+      { spawnSync } = require('child_process'),
       { URL } = require('url'),
       mix = require('laravel-mix'),
       _ = require('lodash'),
@@ -26,6 +27,7 @@ const fs = require('fs'),
       HtmlWebpackPlugin = require('html-webpack-plugin');
 
 const spec = JSON.parse(fs.readFileSync('lib/locales.json'));
+const compressedExtensions = JSON.parse(fs.readFileSync('lib/compressed.json'));
 const message = (key) => `<span data-message="${key}">${spec.en.messages[key]}</span>`;
 const messages = _.transform(spec.en.messages, (result, value, key) => {
     result[`message-${key}`] = message(key);
@@ -161,17 +163,39 @@ const httpdRewrite = (pattern, path, flags) => [
     `RewriteRule ^ ${path.replace(/\$(\d+)/g, '%$1')} [${flags.join(',')}]`
 ].join('\n    ');
 const httpdMatch = (_, match) => `%{ENV:MATCH_${match.toUpperCase()}}`;
+// Lookup tables compiled from the hub mapping. For NGINX, they are only used
+// if enabled and if the variables they refer to are defined by the named
+// groups of the hub regex or by the branch statements.
+const branchMapsType = _.get(configuration, 'branch_maps_type', 'txt');
+const nginxVariables = new Set(_.flatMap([
+    configuration.hub_regex, configuration.hub_branch,
+    configuration.visualization_branch, configuration.prediction_branch
+], (text) => Array.from(text.matchAll(/\(\?P?<(\w+)>|\bset \$(\w+)/g),
+    (match) => match[1] || match[2]
+)));
+const routeMaps = _.filter(_.flatMap(["hub", "visualization", "prediction"],
+    (group) => _.map(configuration.hub_mapping[group], (mapping, env) =>
+        _.assign({group, env, name: `${group}_${env}`}, mapping)
+    )
+), (mapping) => !configuration.proxy_nginx ||
+    (_.get(configuration, 'branch_maps_nginx', false) && _.every(
+        Array.from(`${mapping.input} ${mapping["default"] || ""}`
+            .matchAll(/\$([_a-zA-Z]+)/g), (match) => match[1]
+        ), (variable) => nginxVariables.has(variable)
+    ))
+);
+const nginxString = (value) => `"${value.replace(/[\\"]/g, '\\$&')}"`;
 const convertMatches = function(job, branch, file) {
-    if (configuration.proxy_nginx) {
-        return [job, branch, file];
-    }
     const group = job == "visualization-site" ? "hub" :
         (job.startsWith("prediction") ? "prediction" : "visualization");
     return _.map([job, branch, file], (env) => replaceMatches(group, env));
 };
-const replaceMatches = (group, path) => configuration.proxy_nginx ? path :
+const replaceMatches = (group, path) =>
     path.replace(/\$([_a-zA-Z]+)/g, (substring, match) => {
-        const mapping = configuration.hub_mapping[group][match];
+        const mapping = _.find(routeMaps, {group, env: match});
+        if (configuration.proxy_nginx) {
+            return mapping ? `$${mapping.name}` : substring;
+        }
         if (mapping) {
             const mapInput = mapping.input.replace(/\$([_a-zA-Z]+)/g,
                 httpdMatch
@@ -190,19 +214,72 @@ const nginxRewrite = (pattern, path, redirect=false) => redirect ?
     ].join('\n    ') : `rewrite ${pattern} ${path} break;`);
 
 if (!configuration.proxy_nginx) {
-    _.forEach(["hub", "visualization", "prediction"], (group) => {
-        _.forEach(configuration.hub_mapping[group], (mapping, env) => {
-            const mapFile = `${group}_${env}.txt`;
-            fs.writeFileSync(path.resolve(__dirname, `httpd/maps/${mapFile}`),
-                _.map(mapping.output,
-                    (value, key) => `${key} ${value}`
-                ).join('\n')
+    _.forEach(routeMaps, (mapping) => {
+        const mapFile = path.resolve(__dirname, `httpd/maps/${mapping.name}`);
+        fs.writeFileSync(`${mapFile}.txt`,
+            _.map(mapping.output, (value, key) => `${key} ${value}`).join('\n')
+        );
+        if (branchMapsType === 'dbm') {
+            const result = spawnSync('httxt2dbm',
+                ['-f', 'SDBM', '-i', `${mapFile}.txt`, '-o', mapFile]
             );
-        });
+            if (result.error || result.status !== 0) {
+                console.warn(`Could not convert httpd/maps/${mapping.name}.txt, use httxt2dbm -f SDBM before starting the proxy`);
+            }
+        }
     });
 }
 
 const proxy = configuration.proxy_nginx ? 'nginx' : 'httpd';
+// Assets that Mix lists in its manifest, which are requested with a version
+// hash in production and may thus be cached indefinitely by clients
+const mixManifest = path.resolve(__dirname, 'www/mix-manifest.json');
+const versionedAssets = fs.existsSync(mixManifest) ?
+    _.keys(JSON.parse(fs.readFileSync(mixManifest))) :
+    ['/bundle.js', '/vendor.js', '/main.css', '/navbar.css'];
+// Cache of responses from Jenkins in the proxy, with TTLs in seconds for each
+// class of paths
+const proxyCache = _.assign({
+    path: '',
+    zone_size: '10m',
+    max_size: '1g',
+    inactive: '7d',
+    ttl: {},
+    purge: ''
+}, configuration.proxy_cache);
+// Connection limits of the proxy workers and the pool of connections that the
+// proxy keeps open to each backend, where no pool is used if keepalive is 0
+const proxyWorkers = _.assign({
+    processes: 'auto',
+    connections: 1024,
+    rlimit_nofile: 0,
+    keepalive_timeout: 65,
+    keepalive_requests: 1000
+}, configuration.proxy_workers);
+const proxyPool = _.assign({
+    keepalive: 0,
+    keepalive_requests: 1000,
+    keepalive_timeout: 60
+}, configuration.proxy_pool);
+// Backends of the proxy by their upstream names in the templates
+const proxyBackends = _.uniqBy(_.filter([
+    {name: 'jenkins', host: configuration.jenkins_host, port: 8080},
+    {name: 'blog', host: configuration.blog_host, port: 2368},
+    {name: 'discourse', host: configuration.discussion_host, port: 3000},
+    {
+        name: 'owncloud', host: configuration.files_host, port: 80,
+        enabled: configuration.files_share_id !== ''
+    },
+    {
+        name: 'control', host: configuration.control_host, port: 443,
+        scheme: 'https', enabled: configuration.control_host !== ''
+    }
+], backend => backend.host && backend.enabled !== false), 'host').map(
+    backend => _.assign({scheme: 'http'}, backend, {
+        url: `${backend.scheme || 'http'}://${backend.host}` +
+            (backend.port === 80 || backend.port === 443 ? '' : `:${backend.port}`)
+    })
+);
 const control_host_index = configuration.control_host.indexOf('.');
 const domain_index = configuration.visualization_server.indexOf('.');
 const internal_domain_index = configuration.jenkins_host.indexOf('.');
@@ -221,6 +298,10 @@ const srvConfiguration = _.assign({}, visualizations, _.mapValues(configuration,
     internal_domain: configuration.jenkins_host.slice(internal_domain_index + 1),
     repo_root: typeof process.env.REPO_ROOT !== "undefined" ?
         process.env.REPO_ROOT : 'repos',
+    sample_root: typeof process.env.VISUALIZATION_SAMPLE_ROOT !== "undefined" ?
+        process.env.VISUALIZATION_SAMPLE_ROOT : 'test/sample',
+    replay_log_path: typeof process.env.VISUALIZATION_REPLAY_LOGS !== "undefined" ?
+        process.env.VISUALIZATION_REPLAY_LOGS : '',
     server_certificate: typeof process.env.SERVER_CERTIFICATE !== "undefined" ?
         process.env.SERVER_CERTIFICATE : configuration.auth_cert,
     branch_name: typeof process.env.BRANCH_NAME !== "undefined" ?
@@ -228,6 +309,29 @@ const srvConfiguration = _.assign({}, visualizations, _.mapValues(configuration,
     user_id: process.getuid(),
     group_id: process.getgid(),
     visualization_names: visualization_nginx,
+    versioned_assets: _.map(versionedAssets,
+        asset => _.escapeRegExp(_.trimStart(asset, '/'))
+    ).join('|'),
+    // File extensions for which precompress.py writes compressed variants
+    compressed_extensions: _.map(compressedExtensions, _.escapeRegExp).join('|'),
+    proxy_brotli: _.get(configuration, 'proxy_brotli', false),
+    proxy_cache: proxyCache,
+    proxy_workers: proxyWorkers,
+    proxy_pool: proxyPool,
+    proxy_backends: proxyBackends,
+    route_maps: configuration.proxy_nginx ? _.map(routeMaps, (mapping) => ({
+        name: mapping.name,
+        input: nginxString(mapping.input),
+        default: nginxString(mapping["default"] || ""),
+        entries: _.map(mapping.output, (value, key) => ({
+            // Escape keys that the map would take as parameters or regexes
+            key: nginxString(
+                /^(default|hostnames|include|volatile)$|^[~\\]/.test(key) ?
+                `\\${key}` : key
+            ),
+            value: nginxString(value)
+        }))
+    })) : [],
     prediction_organizations: _.includes(visualization_names, 'prediction-site') ?
         configuration.hub_organizations : [],
     visualization_organizations: _.map(configuration.hub_organizations, 'visualization-site'),
@@ -264,7 +368,13 @@ const srvConfiguration = _.assign({}, visualizations, _.mapValues(configuration,
     upstream: function() {
         return function(text, render) {
             if (configuration.proxy_nginx) {
-                return `$${render(text)}`;
+                // Use the upstream block with the pool of the backend if there
+                // is one, otherwise resolve the host variable on each request
+                const backend = _.find(proxyBackends,
+                    {name: render(text).split(':')[0]}
+                );
+                return proxyPool.keepalive && backend ? backend.host :
+                    `$${render(text)}`;
             }
             const host_parts = render(text).split(':');
             const server = host_parts.shift();
@@ -293,6 +403,32 @@ const srvConfiguration = _.assign({}, visualizations, _.mapValues(configuration,
             return httpdRewrite(pattern, url, flags);
         };
     },
+    jenkins_cache: function() {
+        return function(text, render) {
+            const ttl = proxyCache.ttl[render(text)];
+            if (configuration.jenkins_direct || !proxyCache.path || !ttl) {
+                return '';
+            }
+            if (configuration.proxy_nginx) {
+                return [
+                    'proxy_cache jenkins;',
+                    `proxy_cache_valid 200 ${ttl}s;`,
+                    'proxy_cache_use_stale error timeout updating http_502 http_503 http_504;',
+                    'proxy_cache_lock on;',
+                    'proxy_ignore_headers Cache-Control Expires Set-Cookie;',
+                    'proxy_hide_header Set-Cookie;',
+                    'proxy_no_cache $jenkins_cache_skip;',
+                    'proxy_cache_bypass $jenkins_cache_skip;',
+                    'add_header X-Cache-Status $upstream_cache_status;'
+                ].join('\n    ');
+            }
+            return [
+                'CacheEnable disk',
+                `CacheDefaultExpire ${ttl}`,
+                `CacheMaxExpire ${ttl}`
+            ].join('\n    ');
+        };
+    },
     jenkins_rewrite: function() {
         return function(text, render) {
             const [pattern, path, tags=null] = render(text).split(' ', 3);
@@ -348,10 +484,11 @@ const srvConfiguration = _.assign({}, visualizations, _.mapValues(configuration,
             if (configuration.proxy_nginx) {
                 return configuration[`${group}_branch`];
             }
-            return _.map(configuration.hub_mapping[group], (mapping, env) => {
-                const map = `${group}_${env}`;
-                const mapPath = `${configuration.branch_maps_path}/${map}.txt`;
-                return `RewriteMap ${map} txt:${mapPath}`;
+            return _.map(_.filter(routeMaps, {group}), (mapping) => {
+                const mapPath = `${configuration.branch_maps_path}/${mapping.name}`;
+                return branchMapsType === 'dbm' ?
+                    `RewriteMap ${mapping.name} dbm=sdbm:${mapPath}` :
+                    `RewriteMap ${mapping.name} txt:${mapPath}.txt`;
             }).join('\n');
         };
     },
@@ -394,7 +531,8 @@ const srvConfiguration = _.assign({}, visualizations, _.mapValues(configuration,
 const templates = [
     `${proxy}.conf`, `${proxy}/blog.conf`, `${proxy}/discussion.conf`,
     `${proxy}/prediction.conf`, `${proxy}/visualization.conf`,
-    `${proxy}/websocket.conf`,
+    `${proxy}/websocket.conf`, `${proxy}/assets.conf`,
+    ...(configuration.proxy_nginx ? ['nginx/maps.conf'] : []),
     'caddy/docker-compose.yml', 'caddy/ws', 'caddy/www',
     'test/docker-compose.yml', 'swagger/docker-compose.yml'
 ];
@@ -606,27 +744,32 @@ mix.setPublicPath('www/')
         plugins: [
             new HtmlWebpackPlugin({
                 template: 'template/index.mustache',
-                inject: 'body'
+                inject: 'body',
+                hash: mix.inProduction()
             }),
             new HtmlWebpackPlugin({
                 template: 'template/401.mustache',
                 filename: '401.html',
-                inject: 'body'
+                inject: 'body',
+                hash: mix.inProduction()
             }),
             new HtmlWebpackPlugin({
                 template: 'template/403.mustache',
                 filename: '403.html',
-                inject: 'body'
+                inject: 'body',
+                hash: mix.inProduction()
             }),
             new HtmlWebpackPlugin({
                 template: 'template/404.mustache',
                 filename: '404.html',
-                inject: 'body'
+                inject: 'body',
+                hash: mix.inProduction()
             }),
             new HtmlWebpackPlugin({
                 template: 'template/50x.mustache',
                 filename: '50x.html',
-                inject: 'body'
+                inject: 'body',
+                hash: mix.inProduction()
             })
         ],
         resolve: {
@@ -637,6 +780,11 @@ mix.setPublicPath('www/')
         }
     });
 
+if (mix.inProduction()) {
+    // Add version hashes to the assets in the manifest
+    mix.version();
+}
+
 // Full API
 // mix.js(src, output);
 // mix.react(src, output); <-- Identical to mix.js(), but registers React Babel compilation.